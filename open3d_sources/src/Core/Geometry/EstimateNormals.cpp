@@ -1,3 +1,4 @@
+// ########################## OPEN3D ORIGINAL WORK ############################
 // ----------------------------------------------------------------------------
 // -                        Open3D: www.open3d.org                            -
 // ----------------------------------------------------------------------------
@@ -23,12 +24,45 @@
 // FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS
 // IN THE SOFTWARE.
 // ----------------------------------------------------------------------------
+//
+//
+//
+// ########################## PROCARE MODIFIED WORK ############################
+// Mofifications: block of codes specified by /*kimeguida*/
+// -----------------------------------------------------------------------------
+// <                                  ProCare                                  >
+// -----------------------------------------------------------------------------
+// The MIT License (MIT)
+//
+// Copyright (c) 2020 Merveille Eguida
+//
+// Permission is hereby granted, free of charge, to any person obtaining a copy
+// of this software and associated documentation files (the "Software"), to deal
+// in the Software without restriction, including without limitation the rights
+// to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+// copies of the Software, and to permit persons to whom the Software is
+// furnished to do so, subject to the following conditions:
+//
+// The above copyright notice and this permission notice shall be included in
+// all copies or substantial portions of the Software.
+//
+// THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+// IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+// FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+// AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+// LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING
+// FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS
+// IN THE SOFTWARE.
+
 
 #include "PointCloud.h"
 
 #include <Eigen/Eigenvalues>
 #include <Core/Utility/Console.h>
 #include <Core/Geometry/KDTreeFlann.h>
+/*kimeguida*/
+#include <Core/Geometry/NeighborGraph.h>
+/*kimeguida*/
 
 namespace open3d {
 
@@ -76,15 +110,17 @@ Eigen::Vector3d FastEigen3x3(const Eigen::Matrix3d &A) {
     }
 }
 
+/*kimeguida*/
 Eigen::Vector3d ComputeNormal(const PointCloud &cloud,
-                              const std::vector<int> &indices) {
-    if (indices.size() == 0) {
+                              const int *indices,
+                              size_t num_indices) {
+    if (num_indices == 0) {
         return Eigen::Vector3d::Zero();
     }
     Eigen::Matrix3d covariance;
     Eigen::Matrix<double, 9, 1> cumulants;
     cumulants.setZero();
-    for (size_t i = 0; i < indices.size(); i++) {
+    for (size_t i = 0; i < num_indices; i++) {
         const Eigen::Vector3d &point = cloud.points_[indices[i]];
         cumulants(0) += point(0);
         cumulants(1) += point(1);
@@ -96,7 +132,7 @@ Eigen::Vector3d ComputeNormal(const PointCloud &cloud,
         cumulants(7) += point(1) * point(2);
         cumulants(8) += point(2) * point(2);
     }
-    cumulants /= (double)indices.size();
+    cumulants /= (double)num_indices;
     covariance(0, 0) = cumulants(3) - cumulants(0) * cumulants(0);
     covariance(1, 1) = cumulants(6) - cumulants(1) * cumulants(1);
     covariance(2, 2) = cumulants(8) - cumulants(2) * cumulants(2);
@@ -113,6 +149,12 @@ Eigen::Vector3d ComputeNormal(const PointCloud &cloud,
     // return solver.eigenvectors().col(0);
 }
 
+Eigen::Vector3d ComputeNormal(const PointCloud &cloud,
+                              const std::vector<int> &indices) {
+    return ComputeNormal(cloud, indices.data(), indices.size());
+}
+/*kimeguida*/
+
 }  // unnamed namespace
 
 bool EstimateNormals(
@@ -153,6 +195,49 @@ bool EstimateNormals(
     return true;
 }
 
+/*kimeguida*/
+bool EstimateNormals(PointCloud &cloud,
+                     const NeighborGraph &graph,
+                     int max_nn /* = -1*/) {
+    if (graph.NumPoints() != cloud.points_.size()) {
+        PrintDebug(
+                "[EstimateNormals] Neighbor graph and point cloud sizes "
+                "mismatch.\n");
+        return false;
+    }
+    bool has_normal = cloud.HasNormals();
+    if (cloud.HasNormals() == false) {
+        cloud.normals_.resize(cloud.points_.size());
+    }
+#ifdef _OPENMP
+#pragma omp parallel for schedule(static)
+#endif
+    for (int i = 0; i < (int)cloud.points_.size(); i++) {
+        int num_neighbors = graph.NumNeighbors(i);
+        if (max_nn >= 0 && num_neighbors > max_nn) num_neighbors = max_nn;
+        Eigen::Vector3d normal;
+        if (num_neighbors >= 3) {
+            normal = ComputeNormal(cloud, graph.Neighbors(i), num_neighbors);
+            if (normal.norm() == 0.0) {
+                if (has_normal) {
+                    normal = cloud.normals_[i];
+                } else {
+                    normal = Eigen::Vector3d(0.0, 0.0, 1.0);
+                }
+            }
+            if (has_normal && normal.dot(cloud.normals_[i]) < 0.0) {
+                normal *= -1.0;
+            }
+            cloud.normals_[i] = normal;
+        } else {
+            cloud.normals_[i] = Eigen::Vector3d(0.0, 0.0, 1.0);
+        }
+    }
+
+    return true;
+}
+/*kimeguida*/
+
 bool OrientNormalsToAlignWithDirection(
         PointCloud &cloud, const Eigen::Vector3d &orientation_reference
         /* = Eigen::Vector3d(0.0, 0.0, 1.0)*/) {
@@ -1,3 +1,4 @@
+// ########################## OPEN3D ORIGINAL WORK ############################
 // ----------------------------------------------------------------------------
 // -                        Open3D: www.open3d.org                            -
 // ----------------------------------------------------------------------------
@@ -23,6 +24,36 @@
 // FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS
 // IN THE SOFTWARE.
 // ----------------------------------------------------------------------------
+//
+//
+//
+// ########################## PROCARE MODIFIED WORK ############################
+// Mofifications: block of codes specified by /*kimeguida*/
+// -----------------------------------------------------------------------------
+// <                                  ProCare                                  >
+// -----------------------------------------------------------------------------
+// The MIT License (MIT)
+//
+// Copyright (c) 2020 Merveille Eguida
+//
+// Permission is hereby granted, free of charge, to any person obtaining a copy
+// of this software and associated documentation files (the "Software"), to deal
+// in the Software without restriction, including without limitation the rights
+// to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+// copies of the Software, and to permit persons to whom the Software is
+// furnished to do so, subject to the following conditions:
+//
+// The above copyright notice and this permission notice shall be included in
+// all copies or substantial portions of the Software.
+//
+// THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+// IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+// FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+// AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+// LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING
+// FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS
+// IN THE SOFTWARE.
+
 
 #ifdef _MSC_VER
 #pragma warning(push)
@@ -38,33 +69,78 @@
 
 namespace open3d {
 
+/*kimeguida*/
+namespace {
+
+/// Per-thread buffers of the single precision searches: the query rounded to
+/// float and the float distances. They are reused by all searches of a thread
+/// and only grow, so that repeated KNN and hybrid searches do not allocate.
+struct FloatSearchScratch {
+    std::vector<float> query;
+    std::vector<float> distance2;
+    std::vector<std::vector<int>> indices_vec;
+    std::vector<std::vector<float>> dists_vec;
+};
+
+template <typename T>
+FloatSearchScratch &GetFloatSearchScratch(const T &query, int dimension) {
+    thread_local FloatSearchScratch scratch;
+    scratch.query.resize(dimension);
+    for (int i = 0; i < dimension; i++) scratch.query[i] = float(query(i));
+    return scratch;
+}
+
+}  // unnamed namespace
+/*kimeguida*/
+
 KDTreeFlann::KDTreeFlann() {}
 
-KDTreeFlann::KDTreeFlann(const Eigen::MatrixXd &data) { SetMatrixData(data); }
+/*kimeguida*/
+KDTreeFlann::KDTreeFlann(const Eigen::MatrixXd &data,
+                         bool single_precision /* = false*/) {
+    SetMatrixData(data, single_precision);
+}
 
-KDTreeFlann::KDTreeFlann(const Geometry &geometry) { SetGeometry(geometry); }
+KDTreeFlann::KDTreeFlann(const Geometry &geometry,
+                         bool single_precision /* = false*/) {
+    SetGeometry(geometry, single_precision);
+}
 
-KDTreeFlann::KDTreeFlann(const Feature &feature) { SetFeature(feature); }
+KDTreeFlann::KDTreeFlann(const Feature &feature,
+                         bool single_precision /* = false*/) {
+    SetFeature(feature, single_precision);
+}
+/*kimeguida*/
 
 KDTreeFlann::~KDTreeFlann() {}
 
-bool KDTreeFlann::SetMatrixData(const Eigen::MatrixXd &data) {
+/*kimeguida*/
+bool KDTreeFlann::SetMatrixData(const Eigen::MatrixXd &data,
+                                bool single_precision /* = false*/) {
     return SetRawData(Eigen::Map<const Eigen::MatrixXd>(
-            data.data(), data.rows(), data.cols()));
+                              data.data(), data.rows(), data.cols()),
+                      single_precision);
 }
 
-bool KDTreeFlann::SetGeometry(const Geometry &geometry) {
+bool KDTreeFlann::SetGeometry(const Geometry &geometry,
+                              bool single_precision /* = false*/) {
     switch (geometry.GetGeometryType()) {
         case Geometry::GeometryType::PointCloud:
-            return SetRawData(Eigen::Map<const Eigen::MatrixXd>(
-                    (const double *)((const PointCloud &)geometry)
-                            .points_.data(),
-                    3, ((const PointCloud &)geometry).points_.size()));
+            return SetRawData(
+                    Eigen::Map<const Eigen::MatrixXd>(
+                            (const double *)((const PointCloud &)geometry)
+                                    .points_.data(),
+                            3, ((const PointCloud &)geometry).points_.size()),
+                    single_precision);
         case Geometry::GeometryType::TriangleMesh:
-            return SetRawData(Eigen::Map<const Eigen::MatrixXd>(
-                    (const double *)((const TriangleMesh &)geometry)
-                            .vertices_.data(),
-                    3, ((const TriangleMesh &)geometry).vertices_.size()));
+            return SetRawData(
+                    Eigen::Map<const Eigen::MatrixXd>(
+                            (const double *)((const TriangleMesh &)geometry)
+                                    .vertices_.data(),
+                            3,
+                            ((const TriangleMesh &)geometry).vertices_.size()),
+                    single_precision);
+/*kimeguida*/
         case Geometry::GeometryType::Image:
         case Geometry::GeometryType::Unspecified:
         default:
@@ -74,9 +150,12 @@ bool KDTreeFlann::SetGeometry(const Geometry &geometry) {
     }
 }
 
-bool KDTreeFlann::SetFeature(const Feature &feature) {
-    return SetMatrixData(feature.data_);
+/*kimeguida*/
+bool KDTreeFlann::SetFeature(const Feature &feature,
+                             bool single_precision /* = false*/) {
+    return SetMatrixData(feature.data_, single_precision);
 }
+/*kimeguida*/
 
 template <typename T>
 int KDTreeFlann::Search(const T &query,
@@ -110,10 +189,27 @@ int KDTreeFlann::SearchKNN(const T &query,
     // This is optimized code for heavily repeated search.
     // Other flann::Index::knnSearch() implementations lose performance due to
     // memory allocation/deallocation.
-    if (data_.empty() || dataset_size_ <= 0 || query.rows() != dimension_ ||
-        knn < 0) {
+    /*kimeguida*/
+    if (dataset_size_ <= 0 || query.rows() != dimension_ || knn < 0) {
         return -1;
     }
+    if (single_precision_) {
+        auto &scratch = GetFloatSearchScratch(query, dimension_);
+        scratch.distance2.resize(knn);
+        flann::Matrix<float> query_flann(scratch.query.data(), 1, dimension_);
+        indices.resize(knn);
+        flann::Matrix<int> indices_flann(indices.data(), query_flann.rows, knn);
+        flann::Matrix<float> dists_flann(scratch.distance2.data(),
+                                         query_flann.rows, knn);
+        int k = flann_index_float_->knnSearch(query_flann, indices_flann,
+                                              dists_flann, knn,
+                                              flann::SearchParams(-1, 0.0));
+        indices.resize(k);
+        distance2.assign(scratch.distance2.begin(),
+                         scratch.distance2.begin() + k);
+        return k;
+    }
+    /*kimeguida*/
     flann::Matrix<double> query_flann((double *)query.data(), 1, dimension_);
     indices.resize(knn);
     distance2.resize(knn);
@@ -135,9 +231,25 @@ int KDTreeFlann::SearchRadius(const T &query,
     // Since max_nn is not given, we let flann to do its own memory management.
     // Other flann::Index::radiusSearch() implementations lose performance due
     // to memory management and CPU caching.
-    if (data_.empty() || dataset_size_ <= 0 || query.rows() != dimension_) {
+    /*kimeguida*/
+    if (dataset_size_ <= 0 || query.rows() != dimension_) {
         return -1;
     }
+    if (single_precision_) {
+        auto &scratch = GetFloatSearchScratch(query, dimension_);
+        flann::Matrix<float> query_flann(scratch.query.data(), 1, dimension_);
+        flann::SearchParams param(-1, 0.0);
+        param.max_neighbors = -1;
+        int k = flann_index_float_->radiusSearch(
+                query_flann, scratch.indices_vec, scratch.dists_vec,
+                float(radius * radius), param);
+        indices.assign(scratch.indices_vec[0].begin(),
+                       scratch.indices_vec[0].end());
+        distance2.assign(scratch.dists_vec[0].begin(),
+                         scratch.dists_vec[0].end());
+        return k;
+    }
+    /*kimeguida*/
     flann::Matrix<double> query_flann((double *)query.data(), 1, dimension_);
     flann::SearchParams param(-1, 0.0);
     param.max_neighbors = -1;
@@ -160,10 +272,30 @@ int KDTreeFlann::SearchHybrid(const T &query,
     // It is also the recommended setting for search.
     // Other flann::Index::radiusSearch() implementations lose performance due
     // to memory allocation/deallocation.
-    if (data_.empty() || dataset_size_ <= 0 || query.rows() != dimension_ ||
-        max_nn < 0) {
+    /*kimeguida*/
+    if (dataset_size_ <= 0 || query.rows() != dimension_ || max_nn < 0) {
         return -1;
     }
+    if (single_precision_) {
+        auto &scratch = GetFloatSearchScratch(query, dimension_);
+        scratch.distance2.resize(max_nn);
+        flann::Matrix<float> query_flann(scratch.query.data(), 1, dimension_);
+        flann::SearchParams param(-1, 0.0);
+        param.max_neighbors = max_nn;
+        indices.resize(max_nn);
+        flann::Matrix<int> indices_flann(indices.data(), query_flann.rows,
+                                         max_nn);
+        flann::Matrix<float> dists_flann(scratch.distance2.data(),
+                                         query_flann.rows, max_nn);
+        int k = flann_index_float_->radiusSearch(query_flann, indices_flann,
+                                                 dists_flann,
+                                                 float(radius * radius), param);
+        indices.resize(k);
+        distance2.assign(scratch.distance2.begin(),
+                         scratch.distance2.begin() + k);
+        return k;
+    }
+    /*kimeguida*/
     flann::Matrix<double> query_flann((double *)query.data(), 1, dimension_);
     flann::SearchParams param(-1, 0.0);
     param.max_neighbors = max_nn;
@@ -179,13 +311,34 @@ int KDTreeFlann::SearchHybrid(const T &query,
     return k;
 }
 
-bool KDTreeFlann::SetRawData(const Eigen::Map<const Eigen::MatrixXd> &data) {
+/*kimeguida*/
+bool KDTreeFlann::SetRawData(const Eigen::Map<const Eigen::MatrixXd> &data,
+                             bool single_precision) {
     dimension_ = data.rows();
     dataset_size_ = data.cols();
+    single_precision_ = single_precision;
+    data_.clear();
+    data_float_.clear();
+    flann_index_.reset();
+    flann_dataset_.reset();
+    flann_index_float_.reset();
+    flann_dataset_float_.reset();
     if (dimension_ == 0 || dataset_size_ == 0) {
         PrintDebug("[KDTreeFlann::SetRawData] Failed due to no data.\n");
+        dataset_size_ = 0;
         return false;
     }
+    if (single_precision_) {
+        data_float_.assign(data.data(),
+                           data.data() + dataset_size_ * dimension_);
+        flann_dataset_float_.reset(new flann::Matrix<float>(
+                data_float_.data(), dataset_size_, dimension_));
+        flann_index_float_.reset(new flann::Index<flann::L2<float>>(
+                *flann_dataset_float_, flann::KDTreeSingleIndexParams(15)));
+        flann_index_float_->buildIndex();
+        return true;
+    }
+/*kimeguida*/
     data_.resize(dataset_size_ * dimension_);
     memcpy(data_.data(), data.data(),
            dataset_size_ * dimension_ * sizeof(double));
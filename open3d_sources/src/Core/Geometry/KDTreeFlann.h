@@ -1,3 +1,4 @@
+// ########################## OPEN3D ORIGINAL WORK ############################
 // ----------------------------------------------------------------------------
 // -                        Open3D: www.open3d.org                            -
 // ----------------------------------------------------------------------------
@@ -23,6 +24,36 @@
 // FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS
 // IN THE SOFTWARE.
 // ----------------------------------------------------------------------------
+//
+//
+//
+// ########################## PROCARE MODIFIED WORK ############################
+// Mofifications: block of codes specified by /*kimeguida*/
+// -----------------------------------------------------------------------------
+// <                                  ProCare                                  >
+// -----------------------------------------------------------------------------
+// The MIT License (MIT)
+//
+// Copyright (c) 2020 Merveille Eguida
+//
+// Permission is hereby granted, free of charge, to any person obtaining a copy
+// of this software and associated documentation files (the "Software"), to deal
+// in the Software without restriction, including without limitation the rights
+// to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+// copies of the Software, and to permit persons to whom the Software is
+// furnished to do so, subject to the following conditions:
+//
+// The above copyright notice and this permission notice shall be included in
+// all copies or substantial portions of the Software.
+//
+// THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+// IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+// FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+// AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+// LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING
+// FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS
+// IN THE SOFTWARE.
+
 
 #pragma once
 
@@ -45,20 +76,31 @@ class Index;
 
 namespace open3d {
 
+/*kimeguida*/
+/// With single_precision, data are stored and searched as float32 (half the
+/// memory and bandwidth of the double index); queries are rounded to float
+/// and distances are returned as double.
+/*kimeguida*/
 class KDTreeFlann {
 public:
     KDTreeFlann();
-    KDTreeFlann(const Eigen::MatrixXd &data);
-    KDTreeFlann(const Geometry &geometry);
-    KDTreeFlann(const Feature &feature);
+    /*kimeguida*/
+    KDTreeFlann(const Eigen::MatrixXd &data, bool single_precision = false);
+    KDTreeFlann(const Geometry &geometry, bool single_precision = false);
+    KDTreeFlann(const Feature &feature, bool single_precision = false);
+    /*kimeguida*/
     ~KDTreeFlann();
     KDTreeFlann(const KDTreeFlann &) = delete;
     KDTreeFlann &operator=(const KDTreeFlann &) = delete;
 
 public:
-    bool SetMatrixData(const Eigen::MatrixXd &data);
-    bool SetGeometry(const Geometry &geometry);
-    bool SetFeature(const Feature &feature);
+    /*kimeguida*/
+    bool SetMatrixData(const Eigen::MatrixXd &data,
+                       bool single_precision = false);
+    bool SetGeometry(const Geometry &geometry, bool single_precision = false);
+    bool SetFeature(const Feature &feature, bool single_precision = false);
+    bool IsSinglePrecision() const { return single_precision_; }
+    /*kimeguida*/
 
     template <typename T>
     int Search(const T &query,
@@ -86,7 +128,10 @@ public:
                      std::vector<double> &distance2) const;
 
 private:
-    bool SetRawData(const Eigen::Map<const Eigen::MatrixXd> &data);
+    /*kimeguida*/
+    bool SetRawData(const Eigen::Map<const Eigen::MatrixXd> &data,
+                    bool single_precision);
+    /*kimeguida*/
 
 protected:
     std::vector<double> data_;
@@ -94,6 +139,12 @@ protected:
     std::unique_ptr<flann::Index<flann::L2<double>>> flann_index_;
     size_t dimension_ = 0;
     size_t dataset_size_ = 0;
+    /*kimeguida*/
+    bool single_precision_ = false;
+    std::vector<float> data_float_;
+    std::unique_ptr<flann::Matrix<float>> flann_dataset_float_;
+    std::unique_ptr<flann::Index<flann::L2<float>>> flann_index_float_;
+    /*kimeguida*/
 };
 
 }  // namespace open3d
@@ -0,0 +1,75 @@
+// -----------------------------------------------------------------------------
+// <                                  ProCare                                  >
+// -----------------------------------------------------------------------------
+// The MIT License (MIT)
+//
+// Copyright (c) 2020 Merveille Eguida
+//
+// Permission is hereby granted, free of charge, to any person obtaining a copy
+// of this software and associated documentation files (the "Software"), to deal
+// in the Software without restriction, including without limitation the rights
+// to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+// copies of the Software, and to permit persons to whom the Software is
+// furnished to do so, subject to the following conditions:
+//
+// The above copyright notice and this permission notice shall be included in
+// all copies or substantial portions of the Software.
+//
+// THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+// IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+// FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+// AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+// LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING
+// FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS
+// IN THE SOFTWARE.
+// -----------------------------------------------------------------------------
+
+#include "NeighborGraph.h"
+
+#include <algorithm>
+
+#include <Core/Geometry/PointCloud.h>
+#include <Core/Geometry/KDTreeFlann.h>
+
+namespace open3d {
+
+std::shared_ptr<NeighborGraph> ComputeNeighborGraph(
+        const PointCloud &input,
+        const KDTreeSearchParam &search_param /* = KDTreeSearchParamKNN()*/) {
+    auto graph = std::make_shared<NeighborGraph>();
+    int num_points = (int)input.points_.size();
+    graph->offsets_.resize(num_points + 1, 0);
+    if (num_points == 0) {
+        return graph;
+    }
+    KDTreeFlann kdtree(input);
+    std::vector<std::vector<int>> indices(num_points);
+    std::vector<std::vector<double>> distance2(num_points);
+#ifdef _OPENMP
+#pragma omp parallel for schedule(static)
+#endif
+    for (int i = 0; i < num_points; i++) {
+        if (kdtree.Search(input.points_[i], search_param, indices[i],
+                          distance2[i]) < 0) {
+            indices[i].clear();
+            distance2[i].clear();
+        }
+    }
+    for (int i = 0; i < num_points; i++) {
+        graph->offsets_[i + 1] = graph->offsets_[i] + (int)indices[i].size();
+    }
+    graph->indices_.resize(graph->offsets_[num_points]);
+    graph->distance2_.resize(graph->offsets_[num_points]);
+#ifdef _OPENMP
+#pragma omp parallel for schedule(static)
+#endif
+    for (int i = 0; i < num_points; i++) {
+        std::copy(indices[i].begin(), indices[i].end(),
+                  graph->indices_.begin() + graph->offsets_[i]);
+        std::copy(distance2[i].begin(), distance2[i].end(),
+                  graph->distance2_.begin() + graph->offsets_[i]);
+    }
+    return graph;
+}
+
+}  // namespace open3d
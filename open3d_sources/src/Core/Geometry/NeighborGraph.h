@@ -0,0 +1,62 @@
+// -----------------------------------------------------------------------------
+// <                                  ProCare                                  >
+// -----------------------------------------------------------------------------
+// The MIT License (MIT)
+//
+// Copyright (c) 2020 Merveille Eguida
+//
+// Permission is hereby granted, free of charge, to any person obtaining a copy
+// of this software and associated documentation files (the "Software"), to deal
+// in the Software without restriction, including without limitation the rights
+// to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+// copies of the Software, and to permit persons to whom the Software is
+// furnished to do so, subject to the following conditions:
+//
+// The above copyright notice and this permission notice shall be included in
+// all copies or substantial portions of the Software.
+//
+// THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+// IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+// FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+// AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+// LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING
+// FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS
+// IN THE SOFTWARE.
+// -----------------------------------------------------------------------------
+
+#pragma once
+
+#include <vector>
+#include <memory>
+#include <Core/Geometry/KDTreeSearchParam.h>
+
+namespace open3d {
+
+class PointCloud;
+
+/// Neighbors of every point of a point cloud, in compressed sparse row form:
+/// the neighbors of point i are indices_[offsets_[i]] to
+/// indices_[offsets_[i + 1] - 1], sorted by distance, the point itself first.
+class NeighborGraph {
+public:
+    size_t NumPoints() const {
+        return offsets_.empty() ? 0 : offsets_.size() - 1;
+    }
+    int NumNeighbors(int i) const { return offsets_[i + 1] - offsets_[i]; }
+    const int *Neighbors(int i) const { return indices_.data() + offsets_[i]; }
+    const double *Distance2(int i) const {
+        return distance2_.data() + offsets_[i];
+    }
+
+public:
+    std::vector<int> offsets_;
+    std::vector<int> indices_;
+    std::vector<double> distance2_;
+};
+
+/// Function to search the neighbors of every point of a point cloud once
+std::shared_ptr<NeighborGraph> ComputeNeighborGraph(
+        const PointCloud &input,
+        const KDTreeSearchParam &search_param = KDTreeSearchParamKNN());
+
+}  // namespace open3d
@@ -1,3 +1,4 @@
+// ########################## OPEN3D ORIGINAL WORK ############################
 // ----------------------------------------------------------------------------
 // -                        Open3D: www.open3d.org                            -
 // ----------------------------------------------------------------------------
@@ -23,6 +24,36 @@
 // FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS
 // IN THE SOFTWARE.
 // ----------------------------------------------------------------------------
+//
+//
+//
+// ########################## PROCARE MODIFIED WORK ############################
+// Mofifications: block of codes specified by /*kimeguida*/
+// -----------------------------------------------------------------------------
+// <                                  ProCare                                  >
+// -----------------------------------------------------------------------------
+// The MIT License (MIT)
+//
+// Copyright (c) 2020 Merveille Eguida
+//
+// Permission is hereby granted, free of charge, to any person obtaining a copy
+// of this software and associated documentation files (the "Software"), to deal
+// in the Software without restriction, including without limitation the rights
+// to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+// copies of the Software, and to permit persons to whom the Software is
+// furnished to do so, subject to the following conditions:
+//
+// The above copyright notice and this permission notice shall be included in
+// all copies or substantial portions of the Software.
+//
+// THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+// IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+// FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+// AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+// LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING
+// FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS
+// IN THE SOFTWARE.
+
 
 #include "PointCloud.h"
 
@@ -36,6 +67,9 @@ void PointCloud::Clear() {
     points_.clear();
     normals_.clear();
     colors_.clear();
+    /*kimeguida*/
+    labels_.clear();
+    /*kimeguida*/
 }
 
 bool PointCloud::IsEmpty() const { return !HasPoints(); }
@@ -120,6 +154,15 @@ PointCloud &PointCloud::operator+=(const PointCloud &cloud) {
     } else {
         colors_.clear();
     }
+    /*kimeguida*/
+    if ((!HasPoints() || HasLabels()) && cloud.HasLabels()) {
+        labels_.resize(new_vert_num);
+        for (size_t i = 0; i < add_vert_num; i++)
+            labels_[old_vert_num + i] = cloud.labels_[i];
+    } else {
+        labels_.clear();
+    }
+    /*kimeguida*/
     points_.resize(new_vert_num);
     for (size_t i = 0; i < add_vert_num; i++)
         points_[old_vert_num + i] = cloud.points_[i];
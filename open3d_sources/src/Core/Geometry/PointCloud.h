@@ -1,3 +1,4 @@
+// ########################## OPEN3D ORIGINAL WORK ############################
 // ----------------------------------------------------------------------------
 // -                        Open3D: www.open3d.org                            -
 // ----------------------------------------------------------------------------
@@ -23,11 +24,44 @@
 // FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS
 // IN THE SOFTWARE.
 // ----------------------------------------------------------------------------
+//
+//
+//
+// ########################## PROCARE MODIFIED WORK ############################
+// Mofifications: block of codes specified by /*kimeguida*/
+// -----------------------------------------------------------------------------
+// <                                  ProCare                                  >
+// -----------------------------------------------------------------------------
+// The MIT License (MIT)
+//
+// Copyright (c) 2020 Merveille Eguida
+//
+// Permission is hereby granted, free of charge, to any person obtaining a copy
+// of this software and associated documentation files (the "Software"), to deal
+// in the Software without restriction, including without limitation the rights
+// to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+// copies of the Software, and to permit persons to whom the Software is
+// furnished to do so, subject to the following conditions:
+//
+// The above copyright notice and this permission notice shall be included in
+// all copies or substantial portions of the Software.
+//
+// THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+// IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+// FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+// AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+// LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING
+// FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS
+// IN THE SOFTWARE.
+
 
 #pragma once
 
 #include <tuple>
 #include <vector>
+/*kimeguida*/
+#include <cstdint>
+/*kimeguida*/
 #include <memory>
 #include <Eigen/Core>
 #include <Core/Geometry/Geometry3D.h>
@@ -38,6 +72,9 @@ namespace open3d {
 class Image;
 class RGBDImage;
 class PinholeCameraIntrinsic;
+/*kimeguida*/
+class NeighborGraph;
+/*kimeguida*/
 
 class PointCloud : public Geometry3D {
 public:
@@ -66,6 +103,12 @@ public:
         return points_.size() > 0 && colors_.size() == points_.size();
     }
 
+    /*kimeguida*/
+    bool HasLabels() const {
+        return points_.size() > 0 && labels_.size() == points_.size();
+    }
+    /*kimeguida*/
+
     void NormalizeNormals() {
         for (size_t i = 0; i < normals_.size(); i++) {
             normals_[i].normalize();
@@ -83,6 +126,11 @@ public:
     std::vector<Eigen::Vector3d> points_;
     std::vector<Eigen::Vector3d> normals_;
     std::vector<Eigen::Vector3d> colors_;
+    /*kimeguida*/
+    /// Pharmacophore label of each point, in the order of the CFPFH color
+    /// bins (CA, CZ, O, OD1, OG, N, NZ, DU)
+    std::vector<std::uint8_t> labels_;
+    /*kimeguida*/
 };
 
 /// Factory function to create a pointcloud from a depth image and a camera
@@ -166,6 +214,15 @@ bool EstimateNormals(
         PointCloud &cloud,
         const KDTreeSearchParam &search_param = KDTreeSearchParamKNN());
 
+/*kimeguida*/
+/// Function to compute the normals of a point cloud from the neighbors of a
+/// \param graph computed on this point cloud, at most \param max_nn nearest
+/// neighbors per point (-1 for all of them)
+bool EstimateNormals(PointCloud &cloud,
+                     const NeighborGraph &graph,
+                     int max_nn = -1);
+/*kimeguida*/
+
 /// Function to orient the normals of a point cloud
 /// \param cloud is the input point cloud. It must have normals.
 /// Normals are oriented with respect to \param orientation_reference
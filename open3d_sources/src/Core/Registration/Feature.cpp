@@ -57,10 +57,14 @@
 
 #include "Feature.h"
 
+#include <algorithm>
 #include <Eigen/Dense>
 #include <Core/Utility/Console.h>
 #include <Core/Geometry/PointCloud.h>
 #include <Core/Geometry/KDTreeFlann.h>
+/*kimeguida*/
+#include <Core/Geometry/NeighborGraph.h>
+/*kimeguida*/
 
 namespace open3d {
 
@@ -141,24 +145,58 @@ std::shared_ptr<Feature> ComputeSPFHFeature(
 }
 
 /*kimeguida*/
-std::shared_ptr<Feature> ComputeCSPFHFeature(
-        const PointCloud &input,
-        const KDTreeFlann &kdtree,
-        const KDTreeSearchParam &search_param) {
+/// Pharmacophore labels, in the order of the CFPFH color bins
+const int NUM_LABELS = 8;
+const char *LABEL_COLORS[NUM_LABELS] = {
+        "16741671",  // CA
+        "4646984",   // CZ
+        "15219528",  // O
+        "0",         // OD1
+        "8204959",   // OG
+        "30894",     // N
+        "15231913",  // NZ
+        "7566712"};  // DU
+
+/// Number of neighbors of point i in a sub-search of the graph search: the
+/// sorted neighbors closer than the radius (negative: no radius), at most
+/// max_nn of them (negative: no limit)
+int NumGraphNeighbors(const NeighborGraph &graph,
+                      int i,
+                      double radius,
+                      int max_nn) {
+    int num_neighbors = graph.NumNeighbors(i);
+    if (max_nn >= 0 && num_neighbors > max_nn) num_neighbors = max_nn;
+    if (radius >= 0.0) {
+        // squared radius rounded to float, as compared by FLANN searches
+        double radius2 = (double)float(radius * radius);
+        const double *distance2 = graph.Distance2(i);
+        int k = 0;
+        while (k < num_neighbors && distance2[k] < radius2) k++;
+        num_neighbors = k;
+    }
+    return num_neighbors;
+}
+
+std::shared_ptr<Feature> ComputeCSPFHFeature(const PointCloud &input,
+                                             const NeighborGraph &graph,
+                                             double radius,
+                                             int max_nn) {
     auto feature = std::make_shared<Feature>();
     feature->Resize(41, (int)input.points_.size());
+    // labels are read once, each neighbor is then a single indexed increment
+    std::vector<int> labels = ComputePointLabels(input);
 #ifdef _OPENMP
 #pragma omp parallel for schedule(static)
 #endif
     for (int i = 0; i < (int)input.points_.size(); i++) {
         const auto &point = input.points_[i];
         const auto &normal = input.normals_[i];
-        std::vector<int> indices;
-        std::vector<double> distance2;
-        if (kdtree.Search(point, search_param, indices, distance2) > 1) {
+        const int *indices = graph.Neighbors(i);
+        int num_neighbors = NumGraphNeighbors(graph, i, radius, max_nn);
+        if (num_neighbors > 1) {
             // only compute CSPFH feature when a point has neighbors
-            double hist_incr = 100.0 / (double)(indices.size() - 1);
-            for (size_t k = 1; k < indices.size(); k++) {
+            double hist_incr = 100.0 / (double)(num_neighbors - 1);
+            for (int k = 1; k < num_neighbors; k++) {
                 // skip the point itself, compute histogram
                 auto pf = ComputePairFeatures(point, normal,
                                               input.points_[indices[k]],
@@ -177,64 +215,120 @@ std::shared_ptr<Feature> ComputeCSPFHFeature(
                 feature->data_(h_index + 22, i) += hist_incr;
             }
 
-            double c_hist_incr = 100.0 / (double)(indices.size());
-            const char *CA_c = "16741671";
-            const char *CZ_c = "4646984";
-            const char *O_c = "15219528";
-            const char *OD1_c = "0";
-            const char *OG_c = "8204959";
-            const char *N_c = "30894";
-            const char *NZ_c = "15231913";
-            const char *DU_c = "7566712";
-
-            Eigen::Vector3d CA_rgb = ASCIIPCDColorToRGB(CA_c, 'F', 4);
-            Eigen::Vector3d CZ_rgb = ASCIIPCDColorToRGB(CZ_c, 'F', 4);
-            Eigen::Vector3d O_rgb = ASCIIPCDColorToRGB(O_c, 'F', 4);
-            Eigen::Vector3d OD1_rgb = ASCIIPCDColorToRGB(OD1_c, 'F', 4);
-            Eigen::Vector3d OG_rgb = ASCIIPCDColorToRGB(OG_c, 'F', 4);
-            Eigen::Vector3d N_rgb = ASCIIPCDColorToRGB(N_c, 'F', 4);
-            Eigen::Vector3d NZ_rgb = ASCIIPCDColorToRGB(NZ_c, 'F', 4);
-            Eigen::Vector3d DU_rgb = ASCIIPCDColorToRGB(DU_c, 'F', 4);
-
-            for (size_t k = 0; k < indices.size(); k++) {
+            double c_hist_incr = 100.0 / (double)(num_neighbors);
+            for (int k = 0; k < num_neighbors; k++) {
                 // include the point itself, compute histogram
-                if (input.colors_[indices[k]] == CA_rgb) {
-                    int c_h_index = 33;
-                    feature->data_(c_h_index, i) += c_hist_incr;
-                }
-                if (input.colors_[indices[k]] == CZ_rgb) {
-                    int c_h_index = 34;
-                    feature->data_(c_h_index, i) += c_hist_incr;
-                }
-                if (input.colors_[indices[k]] == O_rgb) {
-                    int c_h_index = 35;
-                    feature->data_(c_h_index, i) += c_hist_incr;
-                }
-                if (input.colors_[indices[k]] == OD1_rgb) {
-                    int c_h_index = 36;
-                    feature->data_(c_h_index, i) += c_hist_incr;
-                }
-                if (input.colors_[indices[k]] == OG_rgb) {
-                    int c_h_index = 37;
-                    feature->data_(c_h_index, i) += c_hist_incr;
-                }
-                if (input.colors_[indices[k]] == N_rgb) {
-                    int c_h_index = 38;
-                    feature->data_(c_h_index, i) += c_hist_incr;
-                }
-                if (input.colors_[indices[k]] == NZ_rgb) {
-                    int c_h_index = 39;
-                    feature->data_(c_h_index, i) += c_hist_incr;
+                int label = labels[indices[k]];
+                if (label >= 0) feature->data_(33 + label, i) += c_hist_incr;
+            }
+        }
+    }
+    return feature;
+}
+
+/// CFPFH feature from the neighbors of a sub-search of the graph search
+std::shared_ptr<Feature> ComputeCFPFHFeatureFromGraph(
+        const PointCloud &input,
+        const NeighborGraph &graph,
+        double radius,
+        int max_nn) {
+    auto feature = std::make_shared<Feature>();
+    feature->Resize(41, (int)input.points_.size());
+    // the neighbors of the CSPFH stage are reused to weight its histograms
+    auto cspfh = ComputeCSPFHFeature(input, graph, radius, max_nn);
+#ifdef _OPENMP
+#pragma omp parallel for schedule(static)
+#endif
+    for (int i = 0; i < (int)input.points_.size(); i++) {
+        const int *indices = graph.Neighbors(i);
+        const double *distance2 = graph.Distance2(i);
+        int num_neighbors = NumGraphNeighbors(graph, i, radius, max_nn);
+        if (num_neighbors > 1) {
+            double sum[3] = {0.0, 0.0, 0.0};
+            double c_sum = 0;
+            for (int k = 1; k < num_neighbors; k++) {
+                // skip the point itself
+                double dist = distance2[k];
+                if (dist == 0.0) continue;
+                for (int j = 0; j < 33; j++) {
+                    double val = cspfh->data_(j, indices[k]) / dist;
+                    sum[j / 11] += val;
+                    feature->data_(j, i) += val;
                 }
-                if (input.colors_[indices[k]] == DU_rgb) {
-                    int c_h_index = 40;
-                    feature->data_(c_h_index, i) += c_hist_incr;
+                for (int j = 33; j < 41; j++) {
+                    double val = cspfh->data_(j, indices[k]) / dist;
+                    c_sum += val;
+                    feature->data_(j, i) += val;
                 }
             }
+            for (int j = 0; j < 3; j++)
+                if (sum[j] != 0.0) sum[j] = 100.0 / sum[j];
+            for (int j = 0; j < 33; j++) {
+                feature->data_(j, i) *= sum[j / 11];
+                // The commented line is the fpfh function in the paper.
+                // But according to PCL implementation, it is skipped.
+                // Our initial test shows that the full fpfh function in the
+                // paper seems to be better than PCL implementation. Further
+                // test required.
+                feature->data_(j, i) += cspfh->data_(j, i);
+            }
+
+            if (c_sum != 0.0) c_sum = 100.0 / c_sum;
+
+            for (int j = 33; j < 41; j++) {
+                feature->data_(j, i) *= c_sum;
+                feature->data_(j, i) += cspfh->data_(j, i);
+            }
         }
     }
     return feature;
 }
+
+/// Number of nearest neighbors kept by a search, -1 when unbounded
+int MaxNeighbors(const KDTreeSearchParam &search_param) {
+    switch (search_param.GetSearchType()) {
+        case KDTreeSearchParam::SearchType::Knn:
+            return ((const KDTreeSearchParamKNN &)search_param).knn_;
+        case KDTreeSearchParam::SearchType::Hybrid:
+            return ((const KDTreeSearchParamHybrid &)search_param).max_nn_;
+        default:
+            return -1;
+    }
+}
+
+/// Search whose sorted neighbors start with the neighbors of both searches,
+/// nullptr when the searches are of different types or radii
+std::unique_ptr<KDTreeSearchParam> SharedSearchParam(
+        const KDTreeSearchParam &param1, const KDTreeSearchParam &param2) {
+    if (param1.GetSearchType() != param2.GetSearchType()) {
+        return nullptr;
+    }
+    switch (param1.GetSearchType()) {
+        case KDTreeSearchParam::SearchType::Knn:
+            return std::unique_ptr<KDTreeSearchParam>(new KDTreeSearchParamKNN(
+                    std::max(MaxNeighbors(param1), MaxNeighbors(param2))));
+        case KDTreeSearchParam::SearchType::Radius: {
+            double radius = ((const KDTreeSearchParamRadius &)param1).radius_;
+            if (radius != ((const KDTreeSearchParamRadius &)param2).radius_) {
+                return nullptr;
+            }
+            return std::unique_ptr<KDTreeSearchParam>(
+                    new KDTreeSearchParamRadius(radius));
+        }
+        case KDTreeSearchParam::SearchType::Hybrid: {
+            double radius = ((const KDTreeSearchParamHybrid &)param1).radius_;
+            if (radius != ((const KDTreeSearchParamHybrid &)param2).radius_) {
+                return nullptr;
+            }
+            return std::unique_ptr<KDTreeSearchParam>(
+                    new KDTreeSearchParamHybrid(
+                            radius, std::max(MaxNeighbors(param1),
+                                             MaxNeighbors(param2))));
+        }
+        default:
+            return nullptr;
+    }
+}
 /*kimeguida*/
 
 }  // unnamed namespace
@@ -304,6 +398,32 @@ Eigen::Vector3d ASCIIPCDColorToRGB(const char *color_ptr,
     }
 }
 
+std::vector<int> ComputePointLabels(const PointCloud &input) {
+    std::vector<int> labels(input.points_.size(), -1);
+    if (input.HasLabels()) {
+        for (int i = 0; i < (int)labels.size(); i++) {
+            if (input.labels_[i] < NUM_LABELS) labels[i] = input.labels_[i];
+        }
+        return labels;
+    }
+    if (input.HasColors() == false) {
+        return labels;
+    }
+    Eigen::Vector3d label_rgb[NUM_LABELS];
+    for (int l = 0; l < NUM_LABELS; l++) {
+        label_rgb[l] = ASCIIPCDColorToRGB(LABEL_COLORS[l], 'F', 4);
+    }
+    for (int i = 0; i < (int)labels.size(); i++) {
+        for (int l = 0; l < NUM_LABELS; l++) {
+            if (input.colors_[i] == label_rgb[l]) {
+                labels[i] = l;
+                break;
+            }
+        }
+    }
+    return labels;
+}
+
 std::shared_ptr<Feature> ComputeCFPFHFeature(
         const PointCloud &input,
         const KDTreeSearchParam
@@ -316,60 +436,112 @@ std::shared_ptr<Feature> ComputeCFPFHFeature(
                 "normal.\n");
         return feature;
     }
-    if (input.HasColors() == false) {
+    if (input.HasLabels() == false && input.HasColors() == false) {
         PrintDebug(
                 "[ComputeCFPFHFeature] Failed because input point cloud has no "
-                "color.\n");
+                "label or color.\n");
         return feature;
     }
-    KDTreeFlann kdtree(input);
-    auto cspfh = ComputeCSPFHFeature(input, kdtree, search_param);
-#ifdef _OPENMP
-#pragma omp parallel for schedule(static)
-#endif
-    for (int i = 0; i < (int)input.points_.size(); i++) {
-        const auto &point = input.points_[i];
-        std::vector<int> indices;
-        std::vector<double> distance2;
-        if (kdtree.Search(point, search_param, indices, distance2) > 1) {
-            double sum[3] = {0.0, 0.0, 0.0};
-            double c_sum = 0;
-            for (size_t k = 1; k < indices.size(); k++) {
-                // skip the point itself
-                double dist = distance2[k];
-                if (dist == 0.0) continue;
-                for (int j = 0; j < 33; j++) {
-                    double val = cspfh->data_(j, indices[k]) / dist;
-                    sum[j / 11] += val;
-                    feature->data_(j, i) += val;
-                }
-                for (int j = 33; j < 41; j++) {
-                    double val = cspfh->data_(j, indices[k]) / dist;
-                    c_sum += val;
-                    feature->data_(j, i) += val;
-                }
-            }
-            for (int j = 0; j < 3; j++)
-                if (sum[j] != 0.0) sum[j] = 100.0 / sum[j];
-            for (int j = 0; j < 33; j++) {
-                feature->data_(j, i) *= sum[j / 11];
-                // The commented line is the fpfh function in the paper.
-                // But according to PCL implementation, it is skipped.
-                // Our initial test shows that the full fpfh function in the
-                // paper seems to be better than PCL implementation. Further
-                // test required.
-                feature->data_(j, i) += cspfh->data_(j, i);
-            }
+    auto graph = ComputeNeighborGraph(input, search_param);
+    return ComputeCFPFHFeature(input, *graph);
+}
 
-            if (c_sum != 0.0) c_sum = 100.0 / c_sum;
+std::shared_ptr<Feature> ComputeCFPFHFeature(const PointCloud &input,
+                                             const NeighborGraph &graph,
+                                             int max_nn /* = -1*/) {
+    auto feature = std::make_shared<Feature>();
+    feature->Resize(41, (int)input.points_.size());
+    if (input.HasNormals() == false) {
+        PrintDebug(
+                "[ComputeCFPFHFeature] Failed because input point cloud has no "
+                "normal.\n");
+        return feature;
+    }
+    if (input.HasLabels() == false && input.HasColors() == false) {
+        PrintDebug(
+                "[ComputeCFPFHFeature] Failed because input point cloud has no "
+                "label or color.\n");
+        return feature;
+    }
+    if (graph.NumPoints() != input.points_.size()) {
+        PrintDebug(
+                "[ComputeCFPFHFeature] Failed because neighbor graph and point "
+                "cloud sizes mismatch.\n");
+        return feature;
+    }
+    return ComputeCFPFHFeatureFromGraph(input, graph, -1.0, max_nn);
+}
 
-            for (int j = 33; j < 41; j++) {
-                feature->data_(j, i) *= c_sum;
-                feature->data_(j, i) += cspfh->data_(j, i);
-            }
-        }
+std::vector<std::shared_ptr<Feature>> ComputeCFPFHFeatureMultiScale(
+        const PointCloud &input,
+        const std::vector<KDTreeSearchParamHybrid> &search_params) {
+    std::vector<std::shared_ptr<Feature>> features;
+    if (input.HasNormals() == false) {
+        PrintDebug(
+                "[ComputeCFPFHFeatureMultiScale] Failed because input point "
+                "cloud has no normal.\n");
+        return features;
     }
-    return feature;
+    if (input.HasLabels() == false && input.HasColors() == false) {
+        PrintDebug(
+                "[ComputeCFPFHFeatureMultiScale] Failed because input point "
+                "cloud has no label or color.\n");
+        return features;
+    }
+    if (search_params.empty()) {
+        return features;
+    }
+    // one search at the largest radius and max_nn: the sorted neighbors of
+    // each scale are the ones of this search closer than its radius, at most
+    // its max_nn of them
+    double radius = 0.0;
+    int max_nn = 0;
+    for (const auto &search_param : search_params) {
+        radius = std::max(radius, search_param.radius_);
+        max_nn = std::max(max_nn, search_param.max_nn_);
+    }
+    auto graph =
+            ComputeNeighborGraph(input, KDTreeSearchParamHybrid(radius, max_nn));
+    for (const auto &search_param : search_params) {
+        features.push_back(ComputeCFPFHFeatureFromGraph(
+                input, *graph, search_param.radius_, search_param.max_nn_));
+    }
+    return features;
+}
+
+std::shared_ptr<Feature> ComputeNormalsAndCFPFHFeature(
+        PointCloud &input,
+        const KDTreeSearchParam &normal_search_param,
+        const KDTreeSearchParam &feature_search_param) {
+    auto search_param =
+            SharedSearchParam(normal_search_param, feature_search_param);
+    if (search_param == nullptr) {
+        EstimateNormals(input, normal_search_param);
+        return ComputeCFPFHFeature(input, feature_search_param);
+    }
+    // one neighbor search serves both stages: each keeps at most its own
+    // number of nearest neighbors
+    auto graph = ComputeNeighborGraph(input, *search_param);
+    EstimateNormals(input, *graph, MaxNeighbors(normal_search_param));
+    return ComputeCFPFHFeature(input, *graph,
+                               MaxNeighbors(feature_search_param));
+}
+
+std::vector<std::shared_ptr<Feature>> ComputeNormalsAndCFPFHFeatureBatch(
+        const std::vector<std::shared_ptr<PointCloud>> &inputs,
+        const KDTreeSearchParam &normal_search_param,
+        const KDTreeSearchParam &feature_search_param) {
+    std::vector<std::shared_ptr<Feature>> features(inputs.size());
+    // one cloud per thread: the parallel regions of a cloud are nested in
+    // this one and run on a single thread
+#ifdef _OPENMP
+#pragma omp parallel for schedule(dynamic)
+#endif
+    for (int i = 0; i < (int)inputs.size(); i++) {
+        features[i] = ComputeNormalsAndCFPFHFeature(
+                *inputs[i], normal_search_param, feature_search_param);
+    }
+    return features;
 }
 /*kimeguida*/
 }  // namespace open3d
@@ -65,6 +65,9 @@
 namespace open3d {
 
 class PointCloud;
+/*kimeguida*/
+class NeighborGraph;
+/*kimeguida*/
 
 class Feature {
 public:
@@ -90,9 +93,43 @@ std::shared_ptr<Feature> ComputeCFPFHFeature(
         const PointCloud &input,
         const KDTreeSearchParam &search_param = KDTreeSearchParamKNN());
 
+/// Function to compute CFPFH feature for a point cloud from the neighbors of
+/// a \param graph computed on this point cloud, at most \param max_nn nearest
+/// neighbors per point (-1 for all of them)
+std::shared_ptr<Feature> ComputeCFPFHFeature(const PointCloud &input,
+                                             const NeighborGraph &graph,
+                                             int max_nn = -1);
+
+/// Function to compute CFPFH features of a point cloud at several scales, one
+/// Feature per search parameter, from a single search at the largest radius
+std::vector<std::shared_ptr<Feature>> ComputeCFPFHFeatureMultiScale(
+        const PointCloud &input,
+        const std::vector<KDTreeSearchParamHybrid> &search_params);
+
 Eigen::Vector3d ASCIIPCDColorToRGB(const char *color_ptr,
                                    const char type,
                                    const int size);
+
+/// Function to get the pharmacophore label of each point, in the order of the
+/// CFPFH color bins: its label if the point cloud has labels, else decoded
+/// from its color. -1 for other labels or colors.
+std::vector<int> ComputePointLabels(const PointCloud &input);
+
+/// Function to estimate normals, then compute CFPFH feature, for a point cloud.
+/// When both searches have the same type and radius, the neighbors are
+/// searched once and shared by the two stages.
+std::shared_ptr<Feature> ComputeNormalsAndCFPFHFeature(
+        PointCloud &input,
+        const KDTreeSearchParam &normal_search_param,
+        const KDTreeSearchParam &feature_search_param);
+
+/// Function to estimate normals and compute CFPFH features for many point
+/// clouds, one cloud per OpenMP thread (nested parallelism disabled, the
+/// default). Features are returned in the order of the point clouds.
+std::vector<std::shared_ptr<Feature>> ComputeNormalsAndCFPFHFeatureBatch(
+        const std::vector<std::shared_ptr<PointCloud>> &inputs,
+        const KDTreeSearchParam &normal_search_param,
+        const KDTreeSearchParam &feature_search_param);
 /*kimeguida*/
 
 }  // namespace open3d
@@ -1,3 +1,4 @@
+// ########################## OPEN3D ORIGINAL WORK ############################
 // ----------------------------------------------------------------------------
 // -                        Open3D: www.open3d.org                            -
 // ----------------------------------------------------------------------------
@@ -23,11 +24,50 @@
 // FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS
 // IN THE SOFTWARE.
 // ----------------------------------------------------------------------------
+//
+//
+//
+// ########################## PROCARE MODIFIED WORK ############################
+// Mofifications: block of codes specified by /*kimeguida*/
+// -----------------------------------------------------------------------------
+// <                                  ProCare                                  >
+// -----------------------------------------------------------------------------
+// The MIT License (MIT)
+//
+// Copyright (c) 2020 Merveille Eguida
+//
+// Permission is hereby granted, free of charge, to any person obtaining a copy
+// of this software and associated documentation files (the "Software"), to deal
+// in the Software without restriction, including without limitation the rights
+// to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+// copies of the Software, and to permit persons to whom the Software is
+// furnished to do so, subject to the following conditions:
+//
+// The above copyright notice and this permission notice shall be included in
+// all copies or substantial portions of the Software.
+//
+// THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+// IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+// FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+// AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+// LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING
+// FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS
+// IN THE SOFTWARE.
+
 
 #include "Registration.h"
 
 #include <cstdlib>
 #include <ctime>
+/*kimeguida*/
+#include <algorithm>
+#include <atomic>
+#include <chrono>
+#include <cmath>
+#include <memory>
+#include <random>
+#include <utility>
+/*kimeguida*/
 
 #include <Core/Utility/Console.h>
 #include <Core/Geometry/PointCloud.h>
@@ -124,6 +164,275 @@ RegistrationResult EvaluateRANSACBasedOnCorrespondence(
     return result;
 }
 
+/*kimeguida*/
+/// Number of RANSAC iterations needed to draw, with probability confidence,
+/// at least one sample of ransac_n inliers when the inlier ratio is fitness.
+int RANSACIterationsForConfidence(double fitness,
+                                  int ransac_n,
+                                  double confidence,
+                                  int max_iteration) {
+    if (confidence >= 1.0 || fitness <= 0.0) return max_iteration;
+    if (fitness >= 1.0) return 0;
+    double all_inliers = std::pow(fitness, ransac_n);
+    if (all_inliers <= 0.0) return max_iteration;
+    double iterations =
+            std::ceil(std::log(1.0 - confidence) / std::log(1.0 - all_inliers));
+    if (iterations >= (double)max_iteration) return max_iteration;
+    return std::max(0, (int)iterations);
+}
+
+/// Lowers value to bound if bound is smaller, without a lock.
+void AtomicMin(std::atomic<int> &value, int bound) {
+    int current = value.load(std::memory_order_relaxed);
+    while (bound < current &&
+           !value.compare_exchange_weak(current, bound,
+                                        std::memory_order_relaxed)) {
+    }
+}
+
+/// Fitness and inlier RMSE of a RANSAC hypothesis, without correspondences.
+/// Source points are transformed into the caller's buffer and searched with
+/// the caller's scratch vectors: nothing is allocated once they are sized.
+/// Points are visited in the given order, starting at start. With
+/// subset_size > 0, the hypothesis is rejected (fitness 0) when the inlier
+/// ratio on the first subset_size points is below best_fitness. It is also
+/// rejected as soon as the remaining points cannot make it reach
+/// best_fitness.
+RegistrationResult EvaluateRANSACHypothesis(
+        const PointCloud &source,
+        const KDTreeFlann &target_kdtree,
+        double max_correspondence_distance,
+        const Eigen::Matrix4d &transformation,
+        const std::vector<int> &order,
+        int start,
+        int subset_size,
+        double best_fitness,
+        std::vector<Eigen::Vector3d> &points,
+        std::vector<int> &indices,
+        std::vector<double> &dists) {
+    RegistrationResult result(transformation);
+    const Eigen::Matrix3d rotation = transformation.block<3, 3>(0, 0);
+    const Eigen::Vector3d translation = transformation.block<3, 1>(0, 3);
+    const int n = (int)source.points_.size();
+    const int best_count = (int)std::lround(best_fitness * n);
+    points.resize(n);
+    double error2 = 0.0;
+    int corres_number = 0;
+    for (int k = 0; k < n; k++) {
+        if (k == subset_size &&
+            (double)corres_number < best_fitness * (double)subset_size)
+            return RegistrationResult(transformation);
+        if (corres_number + (n - k) < best_count)
+            return RegistrationResult(transformation);
+        int i = order[(start + k) % n];
+        points[i] = rotation * source.points_[i] + translation;
+        if (target_kdtree.SearchHybrid(points[i], max_correspondence_distance,
+                                       1, indices, dists) > 0) {
+            error2 += dists[0];
+            corres_number++;
+        }
+    }
+    if (corres_number > 0) {
+        result.fitness_ = (double)corres_number / (double)n;
+        result.inlier_rmse_ = std::sqrt(error2 / (double)corres_number);
+    }
+    return result;
+}
+
+/// Pharmacophore labels, in the order of the CFPFH color bins
+const int NUM_LABELS = 8;
+
+/// Labels that can be paired in LabelMatching::Compatible: same aromatic or
+/// aliphatic carbon, same hydrogen bond donor or acceptor character
+const bool COMPATIBLE_LABELS[NUM_LABELS][NUM_LABELS] = {
+        // CA CZ  O  OD1 OG  N  NZ  DU
+        {1, 1, 0, 0, 0, 0, 0, 0},   // CA
+        {1, 1, 0, 0, 0, 0, 0, 0},   // CZ
+        {0, 0, 1, 1, 1, 0, 0, 0},   // O
+        {0, 0, 1, 1, 1, 0, 0, 0},   // OD1
+        {0, 0, 1, 1, 1, 1, 1, 0},   // OG
+        {0, 0, 0, 0, 1, 1, 1, 0},   // N
+        {0, 0, 0, 0, 1, 1, 1, 0},   // NZ
+        {0, 0, 0, 0, 0, 0, 0, 1}};  // DU
+
+/// Indices of the k nearest reference features of each query feature,
+/// among reference points whose label can be paired with the query label.
+/// Reference features are partitioned by label, with one tree per label.
+std::vector<std::vector<int>> NearestLabelledFeatures(
+        const Feature &query_feature,
+        const std::vector<int> &query_labels,
+        const Feature &reference_feature,
+        const std::vector<int> &reference_labels,
+        int k,
+        LabelMatching label_matching,
+        bool single_precision) {
+    std::vector<std::vector<int>> members(NUM_LABELS);
+    for (int j = 0; j < (int)reference_labels.size(); j++) {
+        if (reference_labels[j] >= 0)
+            members[reference_labels[j]].push_back(j);
+    }
+    std::vector<std::unique_ptr<KDTreeFlann>> kdtrees(NUM_LABELS);
+    for (int l = 0; l < NUM_LABELS; l++) {
+        if (members[l].empty()) continue;
+        Eigen::MatrixXd data(reference_feature.Dimension(),
+                             (int)members[l].size());
+        for (int m = 0; m < (int)members[l].size(); m++) {
+            data.col(m) = reference_feature.data_.col(members[l][m]);
+        }
+        kdtrees[l].reset(new KDTreeFlann(data, single_precision));
+    }
+
+    std::vector<std::vector<int>> nearest(query_feature.Num());
+#ifdef _OPENMP
+#pragma omp parallel
+    {
+#endif
+        std::vector<int> indices(k);
+        std::vector<double> dists(k);
+        std::vector<std::pair<double, int>> candidates;
+#ifdef _OPENMP
+#pragma omp for nowait
+#endif
+        for (int i = 0; i < (int)query_feature.Num(); i++) {
+            int label = query_labels[i];
+            if (label < 0) continue;
+            Eigen::VectorXd query = query_feature.data_.col(i);
+            candidates.clear();
+            for (int l = 0; l < NUM_LABELS; l++) {
+                if (!kdtrees[l]) continue;
+                if (label_matching == LabelMatching::Identical && l != label)
+                    continue;
+                if (label_matching == LabelMatching::Compatible &&
+                    !COMPATIBLE_LABELS[label][l])
+                    continue;
+                int found = kdtrees[l]->SearchKNN(query, k, indices, dists);
+                for (int m = 0; m < found; m++) {
+                    candidates.push_back(
+                            std::make_pair(dists[m], members[l][indices[m]]));
+                }
+            }
+            int kept = std::min(k, (int)candidates.size());
+            std::partial_sort(candidates.begin(), candidates.begin() + kept,
+                              candidates.end());
+            nearest[i].resize(kept);
+            for (int m = 0; m < kept; m++) {
+                nearest[i][m] = candidates[m].second;
+            }
+        }
+#ifdef _OPENMP
+    }
+#endif
+    return nearest;
+}
+
+/// Indices of the num_similar_features nearest target features of each
+/// source feature, computed once and in parallel. With mutual_filter, only
+/// target features whose nearest source feature is the queried one are kept.
+/// With label_matching, features are only paired between points of the
+/// same or of compatible labels, and kdtree_feature is not used.
+/// The trees built here have the precision of kdtree_feature.
+std::vector<std::vector<int>> ComputeSimilarFeatures(
+        const PointCloud &source,
+        const PointCloud &target,
+        const Feature &source_feature,
+        const Feature &target_feature,
+        const KDTreeFlann &kdtree_feature,
+        int num_similar_features,
+        bool mutual_filter,
+        LabelMatching label_matching) {
+    std::vector<std::vector<int>> similar_features(source_feature.Num());
+    std::vector<int> nearest_source(target_feature.Num(), -1);
+    bool single_precision = kdtree_feature.IsSinglePrecision();
+
+    if (label_matching != LabelMatching::Any) {
+        std::vector<int> source_labels = ComputePointLabels(source);
+        std::vector<int> target_labels = ComputePointLabels(target);
+        similar_features = NearestLabelledFeatures(
+                source_feature, source_labels, target_feature, target_labels,
+                num_similar_features, label_matching, single_precision);
+        if (!mutual_filter) return similar_features;
+        auto nearest = NearestLabelledFeatures(
+                target_feature, target_labels, source_feature, source_labels,
+                1, label_matching, single_precision);
+        for (int j = 0; j < (int)nearest.size(); j++) {
+            if (!nearest[j].empty()) nearest_source[j] = nearest[j][0];
+        }
+    } else {
+#ifdef _OPENMP
+#pragma omp parallel
+        {
+#endif
+            std::vector<double> dists(num_similar_features);
+#ifdef _OPENMP
+#pragma omp for nowait
+#endif
+            for (int i = 0; i < (int)source_feature.Num(); i++) {
+                kdtree_feature.SearchKNN(
+                        Eigen::VectorXd(source_feature.data_.col(i)),
+                        num_similar_features, similar_features[i], dists);
+            }
+#ifdef _OPENMP
+        }
+#endif
+        if (!mutual_filter) return similar_features;
+
+        KDTreeFlann kdtree_source_feature(source_feature, single_precision);
+#ifdef _OPENMP
+#pragma omp parallel
+        {
+#endif
+            std::vector<int> indices(1);
+            std::vector<double> dists(1);
+#ifdef _OPENMP
+#pragma omp for nowait
+#endif
+            for (int j = 0; j < (int)target_feature.Num(); j++) {
+                if (kdtree_source_feature.SearchKNN(
+                            Eigen::VectorXd(target_feature.data_.col(j)), 1,
+                            indices, dists) > 0)
+                    nearest_source[j] = indices[0];
+            }
+#ifdef _OPENMP
+        }
+#endif
+    }
+
+    for (int i = 0; i < (int)similar_features.size(); i++) {
+        auto &similar = similar_features[i];
+        similar.erase(std::remove_if(similar.begin(), similar.end(),
+                                     [&](int j) {
+                                         return nearest_source[j] != i;
+                                     }),
+                      similar.end());
+    }
+    return similar_features;
+}
+
+/// Wall-clock budget of a registration; max_time <= 0 means no budget.
+class TimeBudget {
+public:
+    TimeBudget(double max_time)
+        : max_time_(max_time), start_(std::chrono::steady_clock::now()) {}
+
+    bool Expired() const {
+        if (max_time_ <= 0.0) return false;
+        std::chrono::duration<double> elapsed =
+                std::chrono::steady_clock::now() - start_;
+        return elapsed.count() >= max_time_;
+    }
+
+    /// Expired(), reading the clock only every 256 iterations: RANSAC
+    /// iterations are too short to read it on each of them.
+    bool ExpiredAtIteration(int iteration) const {
+        return (iteration & 255) == 0 && Expired();
+    }
+
+private:
+    double max_time_;
+    std::chrono::steady_clock::time_point start_;
+};
+/*kimeguida*/
+
 }  // unnamed namespace
 
 RegistrationResult EvaluateRegistration(
@@ -151,6 +460,24 @@ RegistrationResult RegistrationICP(
         /* = TransformationEstimationPointToPoint(false)*/,
         const ICPConvergenceCriteria
                 &criteria /* = ICPConvergenceCriteria()*/) {
+/*kimeguida*/
+    KDTreeFlann kdtree;
+    kdtree.SetGeometry(target);
+    return RegistrationICP(source, target, kdtree, max_correspondence_distance,
+                           init, estimation, criteria);
+}
+
+RegistrationResult RegistrationICP(
+        const PointCloud &source,
+        const PointCloud &target,
+        const KDTreeFlann &target_kdtree,
+        double max_correspondence_distance,
+        const Eigen::Matrix4d &init /* = Eigen::Matrix4d::Identity()*/,
+        const TransformationEstimation &estimation
+        /* = TransformationEstimationPointToPoint(false)*/,
+        const ICPConvergenceCriteria
+                &criteria /* = ICPConvergenceCriteria()*/) {
+/*kimeguida*/
     if (max_correspondence_distance <= 0.0) {
         PrintError("Error: Invalid max_correspondence_distance.\n");
         return RegistrationResult(init);
@@ -164,9 +491,14 @@ RegistrationResult RegistrationICP(
         return RegistrationResult(init);
     }
 
+/*kimeguida*/
+    TimeBudget budget(criteria.max_time_);
+    bool timed_out = false;
+/*kimeguida*/
     Eigen::Matrix4d transformation = init;
-    KDTreeFlann kdtree;
-    kdtree.SetGeometry(target);
+/*kimeguida*/
+    const KDTreeFlann &kdtree = target_kdtree;
+/*kimeguida*/
     PointCloud pcd = source;
     if (init.isIdentity() == false) {
         pcd.Transform(init);
@@ -175,6 +507,12 @@ RegistrationResult RegistrationICP(
     result = GetRegistrationResultAndCorrespondences(
             pcd, target, kdtree, max_correspondence_distance, transformation);
     for (int i = 0; i < criteria.max_iteration_; i++) {
+/*kimeguida*/
+        if (budget.Expired()) {
+            timed_out = true;
+            break;
+        }
+/*kimeguida*/
         PrintDebug("ICP Iteration #%d: Fitness %.4f, RMSE %.4f\n", i,
                    result.fitness_, result.inlier_rmse_);
         Eigen::Matrix4d update = estimation.ComputeTransformation(
@@ -192,6 +530,9 @@ RegistrationResult RegistrationICP(
             break;
         }
     }
+/*kimeguida*/
+    result.timed_out_ = timed_out;
+/*kimeguida*/
     return result;
 }
 
@@ -204,20 +545,40 @@ RegistrationResult RegistrationRANSACBasedOnCorrespondence(
         /* = TransformationEstimationPointToPoint(false)*/,
         int ransac_n /* = 6*/,
         const RANSACConvergenceCriteria &criteria
-        /* = RANSACConvergenceCriteria()*/) {
+        /* = RANSACConvergenceCriteria()*/,
+        int seed /* = -1*/) {
     if (ransac_n < 3 || (int)corres.size() < ransac_n ||
         max_correspondence_distance <= 0.0) {
         return RegistrationResult();
     }
-    std::srand((unsigned int)std::time(0));
+/*kimeguida*/
+    std::mt19937 engine;
+    if (seed >= 0) {
+        engine.seed((unsigned int)seed);
+    } else {
+        engine.seed(std::random_device()());
+    }
+    std::uniform_int_distribution<int> draw_correspondence(
+            0, (int)corres.size() - 1);
+/*kimeguida*/
     Eigen::Matrix4d transformation;
     CorrespondenceSet ransac_corres(ransac_n);
     RegistrationResult result;
+/*kimeguida*/
+    TimeBudget budget(criteria.max_time_);
+    bool timed_out = false;
+/*kimeguida*/
     for (int itr = 0;
          itr < criteria.max_iteration_ && itr < criteria.max_validation_;
          itr++) {
+/*kimeguida*/
+        if (budget.ExpiredAtIteration(itr)) {
+            timed_out = true;
+            break;
+        }
+/*kimeguida*/
         for (int j = 0; j < ransac_n; j++) {
-            ransac_corres[j] = corres[std::rand() % (int)corres.size()];
+            ransac_corres[j] = corres[draw_correspondence(engine)];
         }
         transformation =
                 estimation.ComputeTransformation(source, target, ransac_corres);
@@ -232,6 +593,9 @@ RegistrationResult RegistrationRANSACBasedOnCorrespondence(
             result = this_result;
         }
     }
+/*kimeguida*/
+    result.timed_out_ = timed_out;
+/*kimeguida*/
     PrintDebug("RANSAC: Fitness %.4f, RMSE %.4f\n", result.fitness_,
                result.inlier_rmse_);
     return result;
@@ -249,65 +613,174 @@ RegistrationResult RegistrationRANSACBasedOnFeatureMatching(
         const std::vector<std::reference_wrapper<const CorrespondenceChecker>>
                 &checkers /* = {}*/,
         const RANSACConvergenceCriteria &criteria
-        /* = RANSACConvergenceCriteria()*/) {
+        /* = RANSACConvergenceCriteria()*/,
+        int seed /* = -1*/,
+        int preemptive_subset_size /* = 0*/,
+        int num_similar_features /* = 1*/,
+        bool mutual_filter /* = false*/,
+        LabelMatching label_matching /* = LabelMatching::Any*/,
+        bool single_precision /* = false*/) {
+/*kimeguida*/
+    KDTreeFlann kdtree(target, single_precision);
+    KDTreeFlann kdtree_feature(target_feature, single_precision);
+    return RegistrationRANSACBasedOnFeatureMatching(
+            source, target, source_feature, target_feature, kdtree,
+            kdtree_feature, max_correspondence_distance, estimation, ransac_n,
+            checkers, criteria, seed, preemptive_subset_size,
+            num_similar_features, mutual_filter, label_matching);
+}
+
+RegistrationResult RegistrationRANSACBasedOnFeatureMatching(
+        const PointCloud &source,
+        const PointCloud &target,
+        const Feature &source_feature,
+        const Feature &target_feature,
+        const KDTreeFlann &target_kdtree,
+        const KDTreeFlann &target_feature_kdtree,
+        double max_correspondence_distance,
+        const TransformationEstimation &estimation
+        /* = TransformationEstimationPointToPoint(false)*/,
+        int ransac_n /* = 4*/,
+        const std::vector<std::reference_wrapper<const CorrespondenceChecker>>
+                &checkers /* = {}*/,
+        const RANSACConvergenceCriteria &criteria
+        /* = RANSACConvergenceCriteria()*/,
+        int seed /* = -1*/,
+        int preemptive_subset_size /* = 0*/,
+        int num_similar_features /* = 1*/,
+        bool mutual_filter /* = false*/,
+        LabelMatching label_matching /* = LabelMatching::Any*/) {
+/*kimeguida*/
     if (ransac_n < 3 || max_correspondence_distance <= 0.0) {
         return RegistrationResult();
     }
+/*kimeguida*/
+    if (num_similar_features < 1) {
+        PrintError("Error: Invalid num_similar_features.\n");
+        return RegistrationResult();
+    }
+    if (label_matching != LabelMatching::Any &&
+        (!(source.HasLabels() || source.HasColors()) ||
+         !(target.HasLabels() || target.HasColors()))) {
+        PrintError("Error: label_matching requires point labels or colors.\n");
+        return RegistrationResult();
+    }
+    // the correspondence pool is read-only in the sampling loop
+    std::vector<std::vector<int>> similar_features = ComputeSimilarFeatures(
+            source, target, source_feature, target_feature,
+            target_feature_kdtree, num_similar_features, mutual_filter,
+            label_matching);
+    std::vector<int> sample_pool;
+    for (int i = 0; i < (int)similar_features.size(); i++) {
+        if (!similar_features[i].empty()) sample_pool.push_back(i);
+    }
+    if (sample_pool.empty()) {
+        return RegistrationResult();
+    }
+/*kimeguida*/
 
     RegistrationResult result;
-    int total_validation = 0;
-    bool finished_validation = false;
-    int num_similar_features = 1;
-    std::vector<std::vector<int>> similar_features(source.points_.size());
+/*kimeguida*/
+    std::atomic<int> total_validation(0);
+    int total_iteration = 0;
+    int result_thread = -1;
+/*kimeguida*/
+    std::atomic<bool> finished_validation(false);
+/*kimeguida*/
+    // iterations are handed out one at a time so that the bound can shrink
+    // as soon as a better hypothesis is found (confidence_ < 1.0); the
+    // shared state is atomic, the sampling loop takes no lock
+    std::atomic<int> next_iteration(0);
+    std::atomic<int> iteration_bound(criteria.max_iteration_);
+    TimeBudget budget(criteria.max_time_);
+    std::atomic<bool> timed_out(false);
+    // with a seed, each thread runs a fixed share of the iterations and
+    // validations so that results only depend on the seed and thread number
+    const bool deterministic = seed >= 0;
+/*kimeguida*/
 
 #ifdef _OPENMP
 #pragma omp parallel
     {
 #endif
         CorrespondenceSet ransac_corres(ransac_n);
-        KDTreeFlann kdtree(target);
-        KDTreeFlann kdtree_feature(target_feature);
+/*kimeguida*/
+        // the target tree is shared, searches are read-only
+        const KDTreeFlann &kdtree = target_kdtree;
+/*kimeguida*/
         RegistrationResult result_private;
-        unsigned int seed_number;
+/*kimeguida*/
+        // per-thread buffers reused by all hypotheses of the thread
+        std::vector<Eigen::Vector3d> transformed_points(source.points_.size());
+        std::vector<int> search_indices(1);
+        std::vector<double> search_dists(1);
+        int thread_id = 0;
+        int num_threads = 1;
 #ifdef _OPENMP
-        // each thread has different seed_number
-        seed_number = (unsigned int)std::time(0) * (omp_get_thread_num() + 1);
-#else
-    seed_number = (unsigned int)std::time(0);
+        thread_id = omp_get_thread_num();
+        num_threads = omp_get_num_threads();
 #endif
-        std::srand(seed_number);
+        // each thread has its own engine: no shared state between threads
+        std::mt19937 engine;
+        if (deterministic) {
+            std::seed_seq seed_sequence{seed, thread_id};
+            engine.seed(seed_sequence);
+        } else {
+            engine.seed(std::random_device()());
+        }
+        std::uniform_int_distribution<int> draw_point(
+                0, (int)source.points_.size() - 1);
+        std::uniform_int_distribution<int> draw_sample(
+                0, (int)sample_pool.size() - 1);
+        // hypotheses are scored on points in a random order per thread,
+        // from a random start: the first points are a random subset
+        std::vector<int> point_order(source.points_.size());
+        for (int i = 0; i < (int)point_order.size(); i++) point_order[i] = i;
+        if (preemptive_subset_size > 0)
+            std::shuffle(point_order.begin(), point_order.end(), engine);
 
-#ifdef _OPENMP
-#pragma omp for nowait
-#endif
-        for (int itr = 0; itr < criteria.max_iteration_; itr++) {
-            if (!finished_validation) {
-                std::vector<double> dists(num_similar_features);
+        int local_iteration = 0;
+        const int local_max_iteration =
+                criteria.max_iteration_ / num_threads +
+                (thread_id < criteria.max_iteration_ % num_threads ? 1 : 0);
+        int local_validation = 0;
+        const int local_max_validation =
+                criteria.max_validation_ / num_threads +
+                (thread_id < criteria.max_validation_ % num_threads ? 1 : 0);
+        int local_bound = criteria.max_iteration_;
+
+        while (true) {
+            if (deterministic) {
+                if (local_iteration >= local_max_iteration ||
+                    local_validation >= local_max_validation ||
+                    (long long)local_iteration * num_threads >= local_bound)
+                    break;
+            } else {
+                int itr = next_iteration.fetch_add(1,
+                                                   std::memory_order_relaxed);
+                if (itr >= iteration_bound.load(std::memory_order_relaxed) ||
+                    finished_validation.load(std::memory_order_relaxed))
+                    break;
+            }
+            local_iteration++;
+            // each thread reads the clock itself: no shared flag to poll
+            if (budget.ExpiredAtIteration(local_iteration)) {
+                timed_out.store(true, std::memory_order_relaxed);
+                break;
+            }
+            {
                 Eigen::Matrix4d transformation;
                 for (int j = 0; j < ransac_n; j++) {
-                    int source_sample_id =
-                            std::rand() % (int)source.points_.size();
-                    if (similar_features[source_sample_id].empty()) {
-                        std::vector<int> indices(num_similar_features);
-                        kdtree_feature.SearchKNN(
-                                Eigen::VectorXd(source_feature.data_.col(
-                                        source_sample_id)),
-                                num_similar_features, indices, dists);
-#ifdef _OPENMP
-#pragma omp critical
-#endif
-                        { similar_features[source_sample_id] = indices; }
-                    }
+                    int source_sample_id = sample_pool[draw_sample(engine)];
+                    const auto &similar = similar_features[source_sample_id];
                     ransac_corres[j](0) = source_sample_id;
-                    if (num_similar_features == 1)
-                        ransac_corres[j](1) =
-                                similar_features[source_sample_id][0];
+                    if (similar.size() == 1)
+                        ransac_corres[j](1) = similar[0];
                     else
                         ransac_corres[j](1) =
-                                similar_features[source_sample_id]
-                                                [std::rand() %
-                                                 num_similar_features];
+                                similar[engine() % similar.size()];
                 }
+/*kimeguida*/
                 bool check = true;
                 for (const auto &checker : checkers) {
                     if (checker.get().require_pointcloud_alignment_ == false &&
@@ -330,45 +803,120 @@ RegistrationResult RegistrationRANSACBasedOnFeatureMatching(
                     }
                 }
                 if (check == false) continue;
-                PointCloud pcd = source;
-                pcd.Transform(transformation);
-                auto this_result = GetRegistrationResultAndCorrespondences(
-                        pcd, target, kdtree, max_correspondence_distance,
-                        transformation);
+/*kimeguida*/
+                auto this_result = EvaluateRANSACHypothesis(
+                        source, kdtree, max_correspondence_distance,
+                        transformation, point_order,
+                        preemptive_subset_size > 0 ? draw_point(engine) : 0,
+                        preemptive_subset_size, result_private.fitness_,
+                        transformed_points, search_indices, search_dists);
+/*kimeguida*/
                 if (this_result.fitness_ > result_private.fitness_ ||
                     (this_result.fitness_ == result_private.fitness_ &&
                      this_result.inlier_rmse_ < result_private.inlier_rmse_)) {
                     result_private = this_result;
+/*kimeguida*/
+                    // the bound decreases with fitness: the shared bound is
+                    // the one of the best fitness over all threads
+                    int bound = RANSACIterationsForConfidence(
+                            result_private.fitness_, ransac_n,
+                            criteria.confidence_, criteria.max_iteration_);
+                    if (deterministic)
+                        local_bound = bound;
+                    else
+                        AtomicMin(iteration_bound, bound);
                 }
-#ifdef _OPENMP
-#pragma omp critical
-#endif
-                {
-                    total_validation = total_validation + 1;
-                    if (total_validation >= criteria.max_validation_)
-                        finished_validation = true;
-                }
-            }  // end of if statement
-        }      // end of for-loop
+                local_validation++;
+                if (total_validation.fetch_add(1, std::memory_order_relaxed) +
+                            1 >=
+                    criteria.max_validation_)
+                    finished_validation.store(true, std::memory_order_relaxed);
+/*kimeguida*/
+            }
+        }  // end of while-loop
 #ifdef _OPENMP
 #pragma omp critical
 #endif
         {
-            if (result_private.fitness_ > result.fitness_ ||
+/*kimeguida*/
+            // ties go to the lowest thread, whatever the thread finishing order
+            if (result_thread < 0 ||
+                result_private.fitness_ > result.fitness_ ||
                 (result_private.fitness_ == result.fitness_ &&
-                 result_private.inlier_rmse_ < result.inlier_rmse_)) {
+                 (result_private.inlier_rmse_ < result.inlier_rmse_ ||
+                  (result_private.inlier_rmse_ == result.inlier_rmse_ &&
+                   thread_id < result_thread)))) {
                 result = result_private;
+                result_thread = thread_id;
             }
+            total_iteration += local_iteration;
+/*kimeguida*/
         }
 #ifdef _OPENMP
     }
 #endif
-    PrintDebug("total_validation : %d\n", total_validation);
+/*kimeguida*/
+    PrintDebug("total_validation : %d\n", (int)total_validation);
+    PrintDebug("RANSAC: %d iterations\n", total_iteration);
+    // correspondences are only computed for the best hypothesis
+    if (result.fitness_ > 0.0) {
+        PointCloud pcd = source;
+        pcd.Transform(result.transformation_);
+        result = GetRegistrationResultAndCorrespondences(
+                pcd, target, target_kdtree, max_correspondence_distance,
+                result.transformation_);
+    }
+    result.timed_out_ = timed_out;
+    if (result.timed_out_) PrintDebug("RANSAC: time budget exceeded\n");
+/*kimeguida*/
     PrintDebug("RANSAC: Fitness %.4f, RMSE %.4f\n", result.fitness_,
                result.inlier_rmse_);
     return result;
 }
 
+/*kimeguida*/
+std::vector<RegistrationResult> RegistrationRANSACBasedOnFeatureMatchingBatch(
+        const PointCloud &source,
+        const Feature &source_feature,
+        const std::vector<std::reference_wrapper<const PointCloud>> &targets,
+        const std::vector<std::reference_wrapper<const Feature>>
+                &target_features,
+        double max_correspondence_distance,
+        const TransformationEstimation &estimation
+        /* = TransformationEstimationPointToPoint(false)*/,
+        int ransac_n /* = 4*/,
+        const std::vector<std::reference_wrapper<const CorrespondenceChecker>>
+                &checkers /* = {}*/,
+        const RANSACConvergenceCriteria &criteria
+        /* = RANSACConvergenceCriteria()*/,
+        int seed /* = -1*/,
+        int preemptive_subset_size /* = 0*/,
+        int num_similar_features /* = 1*/,
+        bool mutual_filter /* = false*/,
+        LabelMatching label_matching /* = LabelMatching::Any*/,
+        bool single_precision /* = false*/) {
+    std::vector<RegistrationResult> results(targets.size());
+    if (targets.size() != target_features.size()) {
+        PrintError("Error: targets and target_features sizes differ.\n");
+        return results;
+    }
+    // one pair per thread: the parallel regions of a pair are nested in this
+    // one and run on a single thread
+#ifdef _OPENMP
+#pragma omp parallel for schedule(dynamic)
+#endif
+    for (int t = 0; t < (int)targets.size(); t++) {
+        results[t] = RegistrationRANSACBasedOnFeatureMatching(
+                source, targets[t].get(), source_feature,
+                target_features[t].get(), max_correspondence_distance,
+                estimation, ransac_n, checkers, criteria, seed,
+                preemptive_subset_size, num_similar_features, mutual_filter,
+                label_matching, single_precision);
+    }
+    return results;
+}
+/*kimeguida*/
+
 Eigen::Matrix6d GetInformationMatrixFromPointClouds(
         const PointCloud &source,
         const PointCloud &target,
@@ -1,3 +1,4 @@
+// ########################## OPEN3D ORIGINAL WORK ############################
 // ----------------------------------------------------------------------------
 // -                        Open3D: www.open3d.org                            -
 // ----------------------------------------------------------------------------
@@ -23,6 +24,36 @@
 // FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS
 // IN THE SOFTWARE.
 // ----------------------------------------------------------------------------
+//
+//
+//
+// ########################## PROCARE MODIFIED WORK ############################
+// Mofifications: block of codes specified by /*kimeguida*/
+// -----------------------------------------------------------------------------
+// <                                  ProCare                                  >
+// -----------------------------------------------------------------------------
+// The MIT License (MIT)
+//
+// Copyright (c) 2020 Merveille Eguida
+//
+// Permission is hereby granted, free of charge, to any person obtaining a copy
+// of this software and associated documentation files (the "Software"), to deal
+// in the Software without restriction, including without limitation the rights
+// to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+// copies of the Software, and to permit persons to whom the Software is
+// furnished to do so, subject to the following conditions:
+//
+// The above copyright notice and this permission notice shall be included in
+// all copies or substantial portions of the Software.
+//
+// THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+// IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+// FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+// AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+// LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING
+// FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS
+// IN THE SOFTWARE.
+
 
 #pragma once
 
@@ -38,25 +69,39 @@ namespace open3d {
 
 class PointCloud;
 class Feature;
+/*kimeguida*/
+class KDTreeFlann;
+/*kimeguida*/
 
 /// Class that defines the convergence criteria of ICP
 /// ICP algorithm stops if the relative change of fitness and rmse hit
 /// relative_fitness_ and relative_rmse_ individually, or the iteration number
 /// exceeds max_iteration_.
+/*kimeguida*/
+/// With max_time_ > 0, ICP also stops after max_time_ seconds and returns the
+/// current result, flagged timed_out_.
+/*kimeguida*/
 class ICPConvergenceCriteria {
 public:
+/*kimeguida*/
     ICPConvergenceCriteria(double relative_fitness = 1e-6,
                            double relative_rmse = 1e-6,
-                           int max_iteration = 30)
+                           int max_iteration = 30,
+                           double max_time = 0.0)
         : relative_fitness_(relative_fitness),
           relative_rmse_(relative_rmse),
-          max_iteration_(max_iteration) {}
+          max_iteration_(max_iteration),
+          max_time_(max_time) {}
+/*kimeguida*/
     ~ICPConvergenceCriteria() {}
 
 public:
     double relative_fitness_;
     double relative_rmse_;
     int max_iteration_;
+/*kimeguida*/
+    double max_time_;
+/*kimeguida*/
 };
 
 /// Class that defines the convergence criteria of RANSAC
@@ -65,24 +110,61 @@ public:
 /// Note that the validation is the most computational expensive operator in an
 /// iteration. Most iterations do not do full validation. It is crucial to
 /// control max_validation_ so that the computation time is acceptable.
+/*kimeguida*/
+/// With confidence_ < 1.0, RANSAC also stops once enough iterations have been
+/// run to draw, with probability confidence_, at least one sample made of
+/// inliers only; the inlier ratio is estimated by the best fitness so far.
+/// confidence_ = 1.0 disables this criterion.
+/// With max_time_ > 0, RANSAC also stops after max_time_ seconds and returns
+/// the best result so far, flagged timed_out_. The time is read every 256
+/// iterations of each thread.
+/*kimeguida*/
 class RANSACConvergenceCriteria {
 public:
+/*kimeguida*/
     RANSACConvergenceCriteria(int max_iteration = 1000,
-                              int max_validation = 1000)
-        : max_iteration_(max_iteration), max_validation_(max_validation) {}
+                              int max_validation = 1000,
+                              double confidence = 1.0,
+                              double max_time = 0.0)
+        : max_iteration_(max_iteration),
+          max_validation_(max_validation),
+          confidence_(confidence),
+          max_time_(max_time) {}
+/*kimeguida*/
     ~RANSACConvergenceCriteria() {}
 
 public:
     int max_iteration_;
     int max_validation_;
+/*kimeguida*/
+    double confidence_;
+    double max_time_;
+/*kimeguida*/
+};
+
+/*kimeguida*/
+/// Pharmacophore labels of the points that can be paired when matching
+/// features: any label, the same label, or compatible labels (CA~CZ;
+/// O~OD1~OG; N~NZ~OG; DU~DU). Labels are the point labels, or are read from
+/// the point colors when the point cloud has no labels.
+enum class LabelMatching {
+    Any = 0,
+    Identical = 1,
+    Compatible = 2,
 };
+/*kimeguida*/
 
 /// Class that contains the registration result
 class RegistrationResult {
 public:
     RegistrationResult(
             const Eigen::Matrix4d &transformation = Eigen::Matrix4d::Identity())
-        : transformation_(transformation), inlier_rmse_(0.0), fitness_(0.0) {}
+/*kimeguida*/
+        : transformation_(transformation),
+          inlier_rmse_(0.0),
+          fitness_(0.0),
+          timed_out_(false) {}
+/*kimeguida*/
     ~RegistrationResult() {}
 
 public:
@@ -90,6 +172,10 @@ public:
     CorrespondenceSet correspondence_set_;
     double inlier_rmse_;
     double fitness_;
+/*kimeguida*/
+    /// true if the registration stopped on the max_time_ budget
+    bool timed_out_;
+/*kimeguida*/
 };
 
 /// Function for evaluation
@@ -109,8 +195,25 @@ RegistrationResult RegistrationICP(
                 TransformationEstimationPointToPoint(false),
         const ICPConvergenceCriteria &criteria = ICPConvergenceCriteria());
 
+/*kimeguida*/
+/// ICP registration with a prebuilt KDTreeFlann of the target points, to be
+/// reused by all registrations onto the same target
+RegistrationResult RegistrationICP(
+        const PointCloud &source,
+        const PointCloud &target,
+        const KDTreeFlann &target_kdtree,
+        double max_correspondence_distance,
+        const Eigen::Matrix4d &init = Eigen::Matrix4d::Identity(),
+        const TransformationEstimation &estimation =
+                TransformationEstimationPointToPoint(false),
+        const ICPConvergenceCriteria &criteria = ICPConvergenceCriteria());
+/*kimeguida*/
+
 /// Function for global RANSAC registration based on a given set of
 /// correspondences
+/*kimeguida*/
+/// seed >= 0 makes the sampling reproducible, seed < 0 seeds it randomly
+/*kimeguida*/
 RegistrationResult RegistrationRANSACBasedOnCorrespondence(
         const PointCloud &source,
         const PointCloud &target,
@@ -120,9 +223,26 @@ RegistrationResult RegistrationRANSACBasedOnCorrespondence(
                 TransformationEstimationPointToPoint(false),
         int ransac_n = 6,
         const RANSACConvergenceCriteria &criteria =
-                RANSACConvergenceCriteria());
+                RANSACConvergenceCriteria(),
+        int seed = -1);
 
 /// Function for global RANSAC registration based on feature matching
+/*kimeguida*/
+/// Each OpenMP thread draws samples from its own random engine.
+/// seed >= 0 makes results reproducible for a given number of threads: each
+/// thread then runs a fixed share of the iterations and validations.
+/// seed < 0 seeds the engines randomly.
+/// With preemptive_subset_size > 0, each hypothesis is first scored on that
+/// many random source points and fully evaluated only if its inlier ratio
+/// there is not below the best fitness of the thread.
+/// Samples are drawn from the num_similar_features nearest target features
+/// of each source feature, computed before sampling; with mutual_filter, a
+/// pair is kept only if the source feature is also the nearest one of the
+/// target feature.
+/// With label_matching, features are only matched between points of the same
+/// or compatible pharmacophore labels, each label having its own tree.
+/// With single_precision, the KD-trees of points and features are float32.
+/*kimeguida*/
 RegistrationResult RegistrationRANSACBasedOnFeatureMatching(
         const PointCloud &source,
         const PointCloud &target,
@@ -135,7 +255,67 @@ RegistrationResult RegistrationRANSACBasedOnFeatureMatching(
         const std::vector<std::reference_wrapper<const CorrespondenceChecker>>
                 &checkers = {},
         const RANSACConvergenceCriteria &criteria =
-                RANSACConvergenceCriteria());
+                RANSACConvergenceCriteria(),
+        int seed = -1,
+        int preemptive_subset_size = 0,
+        int num_similar_features = 1,
+        bool mutual_filter = false,
+        LabelMatching label_matching = LabelMatching::Any,
+        bool single_precision = false);
+
+/*kimeguida*/
+/// RANSAC registration based on feature matching with prebuilt KDTreeFlann
+/// of the target points and target features. The trees are only read: they
+/// are shared by all threads and can be reused for all sources registered
+/// onto the same target. target_feature_kdtree is not used with
+/// label_matching.
+RegistrationResult RegistrationRANSACBasedOnFeatureMatching(
+        const PointCloud &source,
+        const PointCloud &target,
+        const Feature &source_feature,
+        const Feature &target_feature,
+        const KDTreeFlann &target_kdtree,
+        const KDTreeFlann &target_feature_kdtree,
+        double max_correspondence_distance,
+        const TransformationEstimation &estimation =
+                TransformationEstimationPointToPoint(false),
+        int ransac_n = 4,
+        const std::vector<std::reference_wrapper<const CorrespondenceChecker>>
+                &checkers = {},
+        const RANSACConvergenceCriteria &criteria =
+                RANSACConvergenceCriteria(),
+        int seed = -1,
+        int preemptive_subset_size = 0,
+        int num_similar_features = 1,
+        bool mutual_filter = false,
+        LabelMatching label_matching = LabelMatching::Any);
+/*kimeguida*/
+
+/*kimeguida*/
+/// RANSAC registration based on feature matching of one source onto many
+/// targets. Pairs are run in parallel, one pair per OpenMP thread (nested
+/// parallelism disabled, the default); results are in the order of targets.
+std::vector<RegistrationResult> RegistrationRANSACBasedOnFeatureMatchingBatch(
+        const PointCloud &source,
+        const Feature &source_feature,
+        const std::vector<std::reference_wrapper<const PointCloud>> &targets,
+        const std::vector<std::reference_wrapper<const Feature>>
+                &target_features,
+        double max_correspondence_distance,
+        const TransformationEstimation &estimation =
+                TransformationEstimationPointToPoint(false),
+        int ransac_n = 4,
+        const std::vector<std::reference_wrapper<const CorrespondenceChecker>>
+                &checkers = {},
+        const RANSACConvergenceCriteria &criteria =
+                RANSACConvergenceCriteria(),
+        int seed = -1,
+        int preemptive_subset_size = 0,
+        int num_similar_features = 1,
+        bool mutual_filter = false,
+        LabelMatching label_matching = LabelMatching::Any,
+        bool single_precision = false);
+/*kimeguida*/
 
 /// Function for computing information matrix from RegistrationResult
 Eigen::Matrix6d GetInformationMatrixFromPointClouds(
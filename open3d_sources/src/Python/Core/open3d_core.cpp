@@ -1,3 +1,4 @@
+// ########################## OPEN3D ORIGINAL WORK ############################
 // ----------------------------------------------------------------------------
 // -                        Open3D: www.open3d.org                            -
 // ----------------------------------------------------------------------------
@@ -23,9 +24,73 @@
 // FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS
 // IN THE SOFTWARE.
 // ----------------------------------------------------------------------------
+//
+//
+//
+// ########################## PROCARE MODIFIED WORK ############################
+// Mofifications: block of codes specified by /*kimeguida*/
+// -----------------------------------------------------------------------------
+// <                                  ProCare                                  >
+// -----------------------------------------------------------------------------
+// The MIT License (MIT)
+//
+// Copyright (c) 2020 Merveille Eguida
+//
+// Permission is hereby granted, free of charge, to any person obtaining a copy
+// of this software and associated documentation files (the "Software"), to deal
+// in the Software without restriction, including without limitation the rights
+// to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+// copies of the Software, and to permit persons to whom the Software is
+// furnished to do so, subject to the following conditions:
+//
+// The above copyright notice and this permission notice shall be included in
+// all copies or substantial portions of the Software.
+//
+// THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+// IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+// FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+// AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+// LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING
+// FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS
+// IN THE SOFTWARE.
+
 
 #include "open3d_core.h"
 
+/*kimeguida*/
+#include <unordered_map>
+
+namespace {
+
+// number of live NumPy views per storage; views are created and released
+// with the GIL held
+std::unordered_map<const void *, int> &NumpyViewCounts() {
+    static std::unordered_map<const void *, int> counts;
+    return counts;
+}
+
+struct NumpyViewOwner {
+    py::object self;
+    const void *storage;
+};
+
+}  // unnamed namespace
+
+py::capsule NumpyViewBase(py::object self, const void *storage) {
+    NumpyViewCounts()[storage]++;
+    return py::capsule(new NumpyViewOwner{self, storage}, [](void *ptr) {
+        auto owner = static_cast<NumpyViewOwner *>(ptr);
+        auto &counts = NumpyViewCounts();
+        if (--counts[owner->storage] == 0) counts.erase(owner->storage);
+        delete owner;
+    });
+}
+
+void CheckNoNumpyViews(const void *storage, const char *message) {
+    if (NumpyViewCounts().count(storage) > 0) throw py::value_error(message);
+}
+/*kimeguida*/
+
 void pybind_core(py::module &m) {
     py::module m_camera = m.def_submodule("camera");
     py::module m_geometry = m.def_submodule("geometry");
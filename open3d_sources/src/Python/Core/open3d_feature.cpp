@@ -61,6 +61,9 @@
 
 #include <Core/Geometry/PointCloud.h>
 #include <Core/Registration/Feature.h>
+/*kimeguida*/
+#include <Core/Geometry/NeighborGraph.h>
+/*kimeguida*/
 #include <IO/ClassIO/FeatureIO.h>
 using namespace open3d;
 
@@ -69,10 +72,44 @@ void pybind_feature(py::module &m) {
                                                           "Feature");
     py::detail::bind_default_constructor<Feature>(feature);
     py::detail::bind_copy_functions<Feature>(feature);
-    feature.def("resize", &Feature::Resize, "dim"_a, "n"_a)
+    /*kimeguida*/
+    // data is a NumPy view of the feature (no copy), of shape
+    // (dimension, num); the feature cannot be resized or assigned while
+    // views exist
+    feature.def("resize",
+                [](Feature &f, int dim, int n) {
+                    CheckNoNumpyViews(&f.data_,
+                                      "cannot resize a Feature while NumPy "
+                                      "views of its data exist");
+                    f.Resize(dim, n);
+                },
+                "dim"_a, "n"_a)
             .def("dimension", &Feature::Dimension)
             .def("num", &Feature::Num)
-            .def_readwrite("data", &Feature::data_)
+            .def(py::init([](const Eigen::MatrixXd &data) {
+                     auto feature = std::make_shared<Feature>();
+                     feature->data_ = data;
+                     return feature;
+                 }),
+                 "data"_a)
+            .def_property(
+                    "data",
+                    [](py::object self) {
+                        auto &f = self.cast<Feature &>();
+                        return py::array_t<double>(
+                                {f.data_.rows(), f.data_.cols()},
+                                {sizeof(double),
+                                 sizeof(double) * f.data_.rows()},
+                                f.data_.data(),
+                                NumpyViewBase(self, &f.data_));
+                    },
+                    [](Feature &f, const Eigen::MatrixXd &data) {
+                        CheckNoNumpyViews(&f.data_,
+                                          "cannot assign Feature data while "
+                                          "NumPy views of it exist");
+                        f.data_ = data;
+                    })
+            /*kimeguida*/
             .def("__repr__", [](const Feature &f) {
                 return std::string("Feature class with dimension = ") +
                        std::to_string(f.Dimension()) +
@@ -98,8 +135,34 @@ void pybind_feature_methods(py::module &m) {
           "Function to compute FPFH feature for a point cloud", "input"_a,
           "search_param"_a);
 /*kimeguida*/
-    m.def("compute_cfpfh_feature", &ComputeCFPFHFeature,
+    m.def("compute_cfpfh_feature",
+          (std::shared_ptr<Feature>(*)(const PointCloud &,
+                                       const KDTreeSearchParam &)) &
+                  ComputeCFPFHFeature,
           "Function to compute CFPFH feature for a point cloud", "input"_a,
           "search_param"_a);
+    m.def("compute_cfpfh_feature",
+          (std::shared_ptr<Feature>(*)(const PointCloud &,
+                                       const NeighborGraph &, int)) &
+                  ComputeCFPFHFeature,
+          "Function to compute CFPFH feature for a point cloud from a "
+          "neighbor graph of this point cloud",
+          "input"_a, "graph"_a, "max_nn"_a = -1);
+    m.def("compute_cfpfh_feature_multiscale", &ComputeCFPFHFeatureMultiScale,
+          "Function to compute CFPFH features of a point cloud at several "
+          "scales, from a single neighbor search at the largest radius",
+          "input"_a, "search_params"_a);
+    m.def("compute_normals_and_cfpfh_feature",
+          &ComputeNormalsAndCFPFHFeature,
+          "Function to estimate normals, then compute CFPFH feature, for a "
+          "point cloud",
+          "input"_a, "normal_search_param"_a, "feature_search_param"_a);
+    // the GIL is released: clouds are processed on native threads only
+    m.def("compute_normals_and_cfpfh_feature_batch",
+          &ComputeNormalsAndCFPFHFeatureBatch,
+          "Function to estimate normals and compute CFPFH features for a "
+          "list of point clouds, one point cloud per thread",
+          "inputs"_a, "normal_search_param"_a, "feature_search_param"_a,
+          py::call_guard<py::gil_scoped_release>());
 /*kimeguida*/
 }
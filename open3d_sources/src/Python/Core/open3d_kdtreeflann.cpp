@@ -1,3 +1,4 @@
+// ########################## OPEN3D ORIGINAL WORK ############################
 // ----------------------------------------------------------------------------
 // -                        Open3D: www.open3d.org                            -
 // ----------------------------------------------------------------------------
@@ -23,11 +24,45 @@
 // FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS
 // IN THE SOFTWARE.
 // ----------------------------------------------------------------------------
+//
+//
+//
+// ########################## PROCARE MODIFIED WORK ############################
+// Mofifications: block of codes specified by /*kimeguida*/
+// -----------------------------------------------------------------------------
+// <                                  ProCare                                  >
+// -----------------------------------------------------------------------------
+// The MIT License (MIT)
+//
+// Copyright (c) 2020 Merveille Eguida
+//
+// Permission is hereby granted, free of charge, to any person obtaining a copy
+// of this software and associated documentation files (the "Software"), to deal
+// in the Software without restriction, including without limitation the rights
+// to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+// copies of the Software, and to permit persons to whom the Software is
+// furnished to do so, subject to the following conditions:
+//
+// The above copyright notice and this permission notice shall be included in
+// all copies or substantial portions of the Software.
+//
+// THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+// IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+// FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+// AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+// LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING
+// FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS
+// IN THE SOFTWARE.
+
 
 #include "open3d_core.h"
 #include "open3d_core_trampoline.h"
 
 #include <Core/Geometry/KDTreeFlann.h>
+/*kimeguida*/
+#include <Core/Geometry/NeighborGraph.h>
+#include <Core/Geometry/PointCloud.h>
+/*kimeguida*/
 using namespace open3d;
 
 void pybind_kdtreeflann(py::module &m) {
@@ -81,13 +116,22 @@ void pybind_kdtreeflann(py::module &m) {
 
     py::class_<KDTreeFlann, std::shared_ptr<KDTreeFlann>> kdtreeflann(
             m, "KDTreeFlann", "KDTreeFlann");
+    /*kimeguida*/
     kdtreeflann.def(py::init<>())
-            .def(py::init<const Eigen::MatrixXd &>(), "data"_a)
-            .def("set_matrix_data", &KDTreeFlann::SetMatrixData, "data"_a)
-            .def(py::init<const Geometry &>(), "geometry"_a)
-            .def("set_geometry", &KDTreeFlann::SetGeometry, "geometry"_a)
-            .def(py::init<const Feature &>(), "feature"_a)
-            .def("set_feature", &KDTreeFlann::SetFeature, "feature"_a)
+            .def(py::init<const Eigen::MatrixXd &, bool>(), "data"_a,
+                 "single_precision"_a = false)
+            .def("set_matrix_data", &KDTreeFlann::SetMatrixData, "data"_a,
+                 "single_precision"_a = false)
+            .def(py::init<const Geometry &, bool>(), "geometry"_a,
+                 "single_precision"_a = false)
+            .def("set_geometry", &KDTreeFlann::SetGeometry, "geometry"_a,
+                 "single_precision"_a = false)
+            .def(py::init<const Feature &, bool>(), "feature"_a,
+                 "single_precision"_a = false)
+            .def("set_feature", &KDTreeFlann::SetFeature, "feature"_a,
+                 "single_precision"_a = false)
+            .def("is_single_precision", &KDTreeFlann::IsSinglePrecision)
+    /*kimeguida*/
             // Although these C++ style functions are fast by orders of
             // magnitudes when similar queries are performed for a large number
             // of times and memory management is involved, we prefer not to
@@ -203,4 +247,27 @@ void pybind_kdtreeflann(py::module &m) {
                      return std::make_tuple(k, indices, distance2);
                  },
                  "query"_a, "radius"_a, "max_nn"_a);
+
+    /*kimeguida*/
+    py::class_<NeighborGraph, std::shared_ptr<NeighborGraph>> neighborgraph(
+            m, "NeighborGraph", "NeighborGraph");
+    neighborgraph.def(py::init<>())
+            .def("__repr__",
+                 [](const NeighborGraph &graph) {
+                     return std::string("NeighborGraph with ") +
+                            std::to_string(graph.NumPoints()) +
+                            " points and " +
+                            std::to_string(graph.indices_.size()) +
+                            " neighbors.";
+                 })
+            .def("num_points", &NeighborGraph::NumPoints)
+            .def("num_neighbors", &NeighborGraph::NumNeighbors, "i"_a)
+            .def_readonly("offsets", &NeighborGraph::offsets_)
+            .def_readonly("indices", &NeighborGraph::indices_)
+            .def_readonly("distance2", &NeighborGraph::distance2_);
+    m.def("compute_neighbor_graph", &ComputeNeighborGraph,
+          "Function to search the neighbors of every point of a point cloud "
+          "once",
+          "input"_a, "search_param"_a = KDTreeSearchParamKNN());
+    /*kimeguida*/
 }
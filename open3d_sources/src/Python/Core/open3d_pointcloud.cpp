@@ -1,3 +1,4 @@
+// ########################## OPEN3D ORIGINAL WORK ############################
 // ----------------------------------------------------------------------------
 // -                        Open3D: www.open3d.org                            -
 // ----------------------------------------------------------------------------
@@ -23,23 +24,100 @@
 // FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS
 // IN THE SOFTWARE.
 // ----------------------------------------------------------------------------
+//
+//
+//
+// ########################## PROCARE MODIFIED WORK ############################
+// Mofifications: block of codes specified by /*kimeguida*/
+// -----------------------------------------------------------------------------
+// <                                  ProCare                                  >
+// -----------------------------------------------------------------------------
+// The MIT License (MIT)
+//
+// Copyright (c) 2020 Merveille Eguida
+//
+// Permission is hereby granted, free of charge, to any person obtaining a copy
+// of this software and associated documentation files (the "Software"), to deal
+// in the Software without restriction, including without limitation the rights
+// to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+// copies of the Software, and to permit persons to whom the Software is
+// furnished to do so, subject to the following conditions:
+//
+// The above copyright notice and this permission notice shall be included in
+// all copies or substantial portions of the Software.
+//
+// THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+// IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+// FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+// AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+// LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING
+// FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS
+// IN THE SOFTWARE.
+
 
 #include "open3d_core.h"
 #include "open3d_core_trampoline.h"
 
 #include <Core/Geometry/PointCloud.h>
+/*kimeguida*/
+#include <Core/Geometry/NeighborGraph.h>
+#include <cstring>
+/*kimeguida*/
 #include <Core/Geometry/Image.h>
 #include <Core/Geometry/RGBDImage.h>
 #include <Core/Camera/PinholeCameraIntrinsic.h>
 #include <IO/ClassIO/PointCloudIO.h>
 using namespace open3d;
 
+/*kimeguida*/
+namespace {
+
+// Fills an Eigen::Vector3d vector from a (n, 3) array in one bulk copy:
+// Vector3d is three packed doubles, as a C-contiguous float64 row
+void AssignVectors(std::vector<Eigen::Vector3d> &vectors,
+                   const py::object &array) {
+    if (array.is_none()) return;
+    using Array = py::array_t<double, py::array::c_style |
+                                              py::array::forcecast>;
+    auto data = Array::ensure(array);
+    if (!data || data.ndim() != 2 || data.shape(1) != 3) {
+        throw std::runtime_error("Expected an array of shape (n, 3).");
+    }
+    vectors.resize(data.shape(0));
+    std::memcpy(vectors.data(), data.data(), data.size() * sizeof(double));
+}
+
+}  // unnamed namespace
+/*kimeguida*/
+
 void pybind_pointcloud(py::module &m) {
     py::class_<PointCloud, PyGeometry3D<PointCloud>,
                std::shared_ptr<PointCloud>, Geometry3D>
             pointcloud(m, "PointCloud", "PointCloud");
     py::detail::bind_default_constructor<PointCloud>(pointcloud);
     py::detail::bind_copy_functions<PointCloud>(pointcloud);
+    /*kimeguida*/
+    // built from NumPy arrays with one bulk copy per array, instead of a
+    // Vector3dVector conversion of each point
+    pointcloud.def(
+            py::init([](py::object points, py::object normals,
+                        py::object colors, py::object labels) {
+                auto pcd = std::make_shared<PointCloud>();
+                AssignVectors(pcd->points_, points);
+                AssignVectors(pcd->normals_, normals);
+                AssignVectors(pcd->colors_, colors);
+                if (!labels.is_none()) {
+                    auto data = labels.cast<py::array_t<
+                            std::uint8_t,
+                            py::array::c_style | py::array::forcecast>>();
+                    pcd->labels_.assign(data.data(),
+                                        data.data() + data.size());
+                }
+                return pcd;
+            }),
+            "points"_a, "normals"_a = py::none(), "colors"_a = py::none(),
+            "labels"_a = py::none());
+    /*kimeguida*/
     pointcloud
             .def("__repr__",
                  [](const PointCloud &pcd) {
@@ -47,7 +125,25 @@ void pybind_pointcloud(py::module &m) {
                             std::to_string(pcd.points_.size()) + " points.";
                  })
             .def(py::self + py::self)
-            .def(py::self += py::self)
+            /*kimeguida*/
+            // += and clear reallocate the labels, viewed by NumPy arrays
+            .def("__iadd__",
+                 [](PointCloud &pcd, const PointCloud &other) -> PointCloud & {
+                     CheckNoNumpyViews(&pcd.labels_,
+                                       "cannot extend a PointCloud while "
+                                       "NumPy views of its labels exist");
+                     return pcd += other;
+                 },
+                 py::is_operator())
+            .def("clear",
+                 [](PointCloud &pcd) -> PointCloud & {
+                     CheckNoNumpyViews(&pcd.labels_,
+                                       "cannot clear a PointCloud while "
+                                       "NumPy views of its labels exist");
+                     pcd.Clear();
+                     return pcd;
+                 })
+            /*kimeguida*/
             .def("has_points", &PointCloud::HasPoints)
             .def("has_normals", &PointCloud::HasNormals)
             .def("has_colors", &PointCloud::HasColors)
@@ -55,7 +151,31 @@ void pybind_pointcloud(py::module &m) {
             .def("paint_uniform_color", &PointCloud::PaintUniformColor)
             .def_readwrite("points", &PointCloud::points_)
             .def_readwrite("normals", &PointCloud::normals_)
-            .def_readwrite("colors", &PointCloud::colors_);
+            .def_readwrite("colors", &PointCloud::colors_)
+            /*kimeguida*/
+            .def("has_labels", &PointCloud::HasLabels)
+            // NumPy view of the labels (no copy); labels cannot be
+            // assigned while views exist
+            .def_property(
+                    "labels",
+                    [](py::object self) {
+                        auto &pcd = self.cast<PointCloud &>();
+                        return py::array_t<std::uint8_t>(
+                                {pcd.labels_.size()},
+                                {sizeof(std::uint8_t)}, pcd.labels_.data(),
+                                NumpyViewBase(self, &pcd.labels_));
+                    },
+                    [](PointCloud &pcd,
+                       py::array_t<std::uint8_t, py::array::c_style |
+                                                         py::array::forcecast>
+                               labels) {
+                        CheckNoNumpyViews(&pcd.labels_,
+                                          "cannot assign PointCloud labels "
+                                          "while NumPy views of them exist");
+                        pcd.labels_.assign(labels.data(),
+                                           labels.data() + labels.size());
+                    });
+    /*kimeguida*/
 }
 
 void pybind_pointcloud_methods(py::module &m) {
@@ -124,9 +244,19 @@ void pybind_pointcloud_methods(py::module &m) {
           "Function to remove points that are further away from their "
           "neighbours in average",
           "input"_a, "nb_neighbors"_a, "std_ratio"_a);
-    m.def("estimate_normals", &EstimateNormals,
+    /*kimeguida*/
+    m.def("estimate_normals",
+          (bool (*)(PointCloud &, const KDTreeSearchParam &)) &
+                  EstimateNormals,
           "Function to compute the normals of a point cloud", "cloud"_a,
           "search_param"_a = KDTreeSearchParamKNN());
+    m.def("estimate_normals",
+          (bool (*)(PointCloud &, const NeighborGraph &, int)) &
+                  EstimateNormals,
+          "Function to compute the normals of a point cloud from a neighbor "
+          "graph of this point cloud",
+          "cloud"_a, "graph"_a, "max_nn"_a = -1);
+    /*kimeguida*/
     m.def("orient_normals_to_align_with_direction",
           &OrientNormalsToAlignWithDirection,
           "Function to orient the normals of a point cloud", "cloud"_a,
@@ -1,3 +1,4 @@
+// ########################## OPEN3D ORIGINAL WORK ############################
 // ----------------------------------------------------------------------------
 // -                        Open3D: www.open3d.org                            -
 // ----------------------------------------------------------------------------
@@ -23,11 +24,44 @@
 // FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS
 // IN THE SOFTWARE.
 // ----------------------------------------------------------------------------
+//
+//
+//
+// ########################## PROCARE MODIFIED WORK ############################
+// Mofifications: block of codes specified by /*kimeguida*/
+// -----------------------------------------------------------------------------
+// <                                  ProCare                                  >
+// -----------------------------------------------------------------------------
+// The MIT License (MIT)
+//
+// Copyright (c) 2020 Merveille Eguida
+//
+// Permission is hereby granted, free of charge, to any person obtaining a copy
+// of this software and associated documentation files (the "Software"), to deal
+// in the Software without restriction, including without limitation the rights
+// to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+// copies of the Software, and to permit persons to whom the Software is
+// furnished to do so, subject to the following conditions:
+//
+// The above copyright notice and this permission notice shall be included in
+// all copies or substantial portions of the Software.
+//
+// THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+// IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+// FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+// AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+// LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING
+// FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS
+// IN THE SOFTWARE.
+
 
 #include "open3d_core.h"
 #include "open3d_core_trampoline.h"
 
 #include <Core/Geometry/PointCloud.h>
+/*kimeguida*/
+#include <Core/Geometry/KDTreeFlann.h>
+/*kimeguida*/
 #include <Core/Registration/Feature.h>
 #include <Core/Registration/CorrespondenceChecker.h>
 #include <Core/Registration/TransformationEstimation.h>
@@ -74,53 +108,105 @@ public:
     }
 };
 
+/*kimeguida*/
+// Estimations and checkers subclassed in Python call back into the
+// interpreter: they need the GIL
+bool IsPythonTransformationEstimation(
+        const TransformationEstimation &estimation) {
+    return dynamic_cast<const PyTransformationEstimation<
+                   TransformationEstimation> *>(&estimation) != nullptr ||
+           dynamic_cast<const PyTransformationEstimation<
+                   TransformationEstimationPointToPoint> *>(&estimation) !=
+                   nullptr ||
+           dynamic_cast<const PyTransformationEstimation<
+                   TransformationEstimationPointToPlane> *>(&estimation) !=
+                   nullptr;
+}
+
+bool IsPythonCorrespondenceChecker(const CorrespondenceChecker &checker) {
+    return dynamic_cast<const PyCorrespondenceChecker<CorrespondenceChecker> *>(
+                   &checker) != nullptr ||
+           dynamic_cast<const PyCorrespondenceChecker<
+                   CorrespondenceCheckerBasedOnEdgeLength> *>(&checker) !=
+                   nullptr ||
+           dynamic_cast<const PyCorrespondenceChecker<
+                   CorrespondenceCheckerBasedOnDistance> *>(&checker) !=
+                   nullptr ||
+           dynamic_cast<const PyCorrespondenceChecker<
+                   CorrespondenceCheckerBasedOnNormal> *>(&checker) != nullptr;
+}
+/*kimeguida*/
+
 void pybind_registration(py::module &m) {
     py::class_<ICPConvergenceCriteria> convergence_criteria(
             m, "ICPConvergenceCriteria", "ICPConvergenceCriteria");
     py::detail::bind_copy_functions<ICPConvergenceCriteria>(
             convergence_criteria);
     convergence_criteria
-            .def(py::init([](double fitness, double rmse, int itr) {
-                     return new ICPConvergenceCriteria(fitness, rmse, itr);
+/*kimeguida*/
+            .def(py::init([](double fitness, double rmse, int itr,
+                             double max_time) {
+                     return new ICPConvergenceCriteria(fitness, rmse, itr,
+                                                       max_time);
                  }),
                  "relative_fitness"_a = 1e-6, "relative_rmse"_a = 1e-6,
-                 "max_iteration"_a = 30)
+                 "max_iteration"_a = 30, "max_time"_a = 0.0)
+/*kimeguida*/
             .def_readwrite("relative_fitness",
                            &ICPConvergenceCriteria::relative_fitness_)
             .def_readwrite("relative_rmse",
                            &ICPConvergenceCriteria::relative_rmse_)
             .def_readwrite("max_iteration",
                            &ICPConvergenceCriteria::max_iteration_)
+/*kimeguida*/
+            .def_readwrite("max_time", &ICPConvergenceCriteria::max_time_)
             .def("__repr__", [](const ICPConvergenceCriteria &c) {
                 return std::string("ICPConvergenceCriteria class with ") +
                        std::string("relative_fitness = ") +
                        std::to_string(c.relative_fitness_) +
                        std::string(", relative_rmse = ") +
                        std::to_string(c.relative_rmse_) +
-                       std::string(", and max_iteration = " +
-                                   std::to_string(c.max_iteration_));
+                       std::string(", max_iteration = ") +
+                       std::to_string(c.max_iteration_) +
+                       std::string(", and max_time = " +
+                                   std::to_string(c.max_time_));
             });
+/*kimeguida*/
 
     py::class_<RANSACConvergenceCriteria> ransac_criteria(
             m, "RANSACConvergenceCriteria", "RANSACConvergenceCriteria");
     py::detail::bind_copy_functions<RANSACConvergenceCriteria>(ransac_criteria);
     ransac_criteria
-            .def(py::init([](int max_iteration, int max_validation) {
-                     return new RANSACConvergenceCriteria(max_iteration,
-                                                          max_validation);
+/*kimeguida*/
+            .def(py::init([](int max_iteration, int max_validation,
+                             double confidence, double max_time) {
+                     return new RANSACConvergenceCriteria(
+                             max_iteration, max_validation, confidence,
+                             max_time);
                  }),
-                 "max_iteration"_a = 1000, "max_validation"_a = 1000)
+                 "max_iteration"_a = 1000, "max_validation"_a = 1000,
+                 "confidence"_a = 1.0, "max_time"_a = 0.0)
+/*kimeguida*/
             .def_readwrite("max_iteration",
                            &RANSACConvergenceCriteria::max_iteration_)
             .def_readwrite("max_validation",
                            &RANSACConvergenceCriteria::max_validation_)
+/*kimeguida*/
+            .def_readwrite("confidence",
+                           &RANSACConvergenceCriteria::confidence_)
+            .def_readwrite("max_time", &RANSACConvergenceCriteria::max_time_)
             .def("__repr__", [](const RANSACConvergenceCriteria &c) {
                 return std::string("RANSACConvergenceCriteria class with ") +
                        std::string("max_iteration = ") +
                        std::to_string(c.max_iteration_) +
-                       std::string(", and max_validation = " +
-                                   std::to_string(c.max_validation_));
+                       std::string(", max_validation = ") +
+                       std::to_string(c.max_validation_) +
+                       std::string(", confidence = ") +
+                       std::to_string(c.confidence_) +
+                       std::string(", and max_time = " +
+                                   std::to_string(c.max_time_));
             });
+/*kimeguida*/
 
     py::class_<TransformationEstimation,
                PyTransformationEstimation<TransformationEstimation>>
@@ -290,6 +376,15 @@ void pybind_registration(py::module &m) {
                        std::to_string(c.maximum_tuple_count_);
             });
 
+/*kimeguida*/
+    py::enum_<LabelMatching>(m, "LabelMatching", py::arithmetic(),
+                             "LabelMatching")
+            .value("Any", LabelMatching::Any)
+            .value("Identical", LabelMatching::Identical)
+            .value("Compatible", LabelMatching::Compatible)
+            .export_values();
+/*kimeguida*/
+
     py::class_<RegistrationResult> registration_result(m, "RegistrationResult",
                                                        "RegistrationResult");
     py::detail::bind_default_constructor<RegistrationResult>(
@@ -302,6 +397,9 @@ void pybind_registration(py::module &m) {
                            &RegistrationResult::correspondence_set_)
             .def_readwrite("inlier_rmse", &RegistrationResult::inlier_rmse_)
             .def_readwrite("fitness", &RegistrationResult::fitness_)
+/*kimeguida*/
+            .def_readwrite("timed_out", &RegistrationResult::timed_out_)
+/*kimeguida*/
             .def("__repr__", [](const RegistrationResult &rr) {
                 return std::string("RegistrationResult with fitness = ") +
                        std::to_string(rr.fitness_) +
@@ -318,11 +416,31 @@ void pybind_registration_methods(py::module &m) {
           "Function for evaluating registration between point clouds",
           "source"_a, "target"_a, "max_correspondence_distance"_a,
           "transformation"_a = Eigen::Matrix4d::Identity());
-    m.def("registration_icp", &RegistrationICP, "Function for ICP registration",
+/*kimeguida*/
+    // target_kdtree: optional prebuilt KDTreeFlann of the target, reused
+    // across calls with the same target
+    m.def("registration_icp",
+          [](const PointCloud &source, const PointCloud &target,
+             double max_correspondence_distance, const Eigen::Matrix4d &init,
+             const TransformationEstimation &estimation,
+             const ICPConvergenceCriteria &criteria,
+             const KDTreeFlann *target_kdtree) {
+              if (target_kdtree == nullptr) {
+                  return RegistrationICP(source, target,
+                                         max_correspondence_distance, init,
+                                         estimation, criteria);
+              }
+              return RegistrationICP(source, target, *target_kdtree,
+                                     max_correspondence_distance, init,
+                                     estimation, criteria);
+          },
+          "Function for ICP registration",
           "source"_a, "target"_a, "max_correspondence_distance"_a,
           "init"_a = Eigen::Matrix4d::Identity(),
           "estimation_method"_a = TransformationEstimationPointToPoint(false),
-          "criteria"_a = ICPConvergenceCriteria());
+          "criteria"_a = ICPConvergenceCriteria(),
+          "target_kdtree"_a = nullptr);
+/*kimeguida*/
     m.def("registration_colored_icp", &RegistrationColoredICP,
           "Function for Colored ICP registration", "source"_a, "target"_a,
           "max_correspondence_distance"_a,
@@ -335,9 +453,57 @@ void pybind_registration_methods(py::module &m) {
           "correspondences",
           "source"_a, "target"_a, "corres"_a, "max_correspondence_distance"_a,
           "estimation_method"_a = TransformationEstimationPointToPoint(false),
-          "ransac_n"_a = 6, "criteria"_a = RANSACConvergenceCriteria());
+/*kimeguida*/
+          "ransac_n"_a = 6, "criteria"_a = RANSACConvergenceCriteria(),
+          "seed"_a = -1);
+/*kimeguida*/
+/*kimeguida*/
+    // target_kdtree, target_feature_kdtree: optional prebuilt KDTreeFlann of
+    // the target points and features, reused across calls with the same
+    // target; both or none are given. With single_precision, given trees
+    // must be single precision
     m.def("registration_ransac_based_on_feature_matching",
-          &RegistrationRANSACBasedOnFeatureMatching,
+          [](const PointCloud &source, const PointCloud &target,
+             const Feature &source_feature, const Feature &target_feature,
+             double max_correspondence_distance,
+             const TransformationEstimation &estimation, int ransac_n,
+             const std::vector<
+                     std::reference_wrapper<const CorrespondenceChecker>>
+                     &checkers,
+             const RANSACConvergenceCriteria &criteria, int seed,
+             int preemptive_subset_size, int num_similar_features,
+             bool mutual_filter, LabelMatching label_matching,
+             const KDTreeFlann *target_kdtree,
+             const KDTreeFlann *target_feature_kdtree, bool single_precision) {
+              if ((target_kdtree == nullptr) !=
+                  (target_feature_kdtree == nullptr)) {
+                  throw py::value_error(
+                          "target_kdtree and target_feature_kdtree must be "
+                          "given together.");
+              }
+              if (target_kdtree != nullptr && single_precision &&
+                  !(target_kdtree->IsSinglePrecision() &&
+                    target_feature_kdtree->IsSinglePrecision())) {
+                  throw py::value_error(
+                          "single_precision requires single precision "
+                          "target_kdtree and target_feature_kdtree.");
+              }
+              if (target_kdtree == nullptr) {
+                  return RegistrationRANSACBasedOnFeatureMatching(
+                          source, target, source_feature, target_feature,
+                          max_correspondence_distance, estimation, ransac_n,
+                          checkers, criteria, seed, preemptive_subset_size,
+                          num_similar_features, mutual_filter, label_matching,
+                          single_precision);
+              }
+              return RegistrationRANSACBasedOnFeatureMatching(
+                      source, target, source_feature, target_feature,
+                      *target_kdtree, *target_feature_kdtree,
+                      max_correspondence_distance, estimation, ransac_n,
+                      checkers, criteria, seed, preemptive_subset_size,
+                      num_similar_features, mutual_filter, label_matching);
+          },
+/*kimeguida*/
           "Function for global RANSAC registration based on feature matching",
           "source"_a, "target"_a, "source_feature"_a, "target_feature"_a,
           "max_correspondence_distance"_a,
@@ -345,7 +511,66 @@ void pybind_registration_methods(py::module &m) {
           "ransac_n"_a = 4,
           "checkers"_a = std::vector<
                   std::reference_wrapper<const CorrespondenceChecker>>(),
-          "criteria"_a = RANSACConvergenceCriteria(100000, 100));
+/*kimeguida*/
+          "criteria"_a = RANSACConvergenceCriteria(100000, 100),
+          "seed"_a = -1, "preemptive_subset_size"_a = 0,
+          "num_similar_features"_a = 1, "mutual_filter"_a = false,
+          "label_matching"_a = LabelMatching::Any,
+          "target_kdtree"_a = nullptr, "target_feature_kdtree"_a = nullptr,
+          "single_precision"_a = false);
+/*kimeguida*/
+/*kimeguida*/
+    // the GIL is released: pairs run on native threads only, estimations
+    // and checkers subclassed in Python are rejected
+    m.def("registration_ransac_based_on_feature_matching_batch",
+          [](const PointCloud &source, const Feature &source_feature,
+             const std::vector<std::reference_wrapper<const PointCloud>>
+                     &targets,
+             const std::vector<std::reference_wrapper<const Feature>>
+                     &target_features,
+             double max_correspondence_distance,
+             const TransformationEstimation &estimation, int ransac_n,
+             const std::vector<
+                     std::reference_wrapper<const CorrespondenceChecker>>
+                     &checkers,
+             const RANSACConvergenceCriteria &criteria, int seed,
+             int preemptive_subset_size, int num_similar_features,
+             bool mutual_filter, LabelMatching label_matching,
+             bool single_precision) {
+              if (IsPythonTransformationEstimation(estimation)) {
+                  throw py::value_error(
+                          "estimation_method subclassed in Python cannot be "
+                          "used in batch registration.");
+              }
+              for (const auto &checker : checkers) {
+                  if (IsPythonCorrespondenceChecker(checker.get())) {
+                      throw py::value_error(
+                              "checkers subclassed in Python cannot be used "
+                              "in batch registration.");
+                  }
+              }
+              py::gil_scoped_release release;
+              return RegistrationRANSACBasedOnFeatureMatchingBatch(
+                      source, source_feature, targets, target_features,
+                      max_correspondence_distance, estimation, ransac_n,
+                      checkers, criteria, seed, preemptive_subset_size,
+                      num_similar_features, mutual_filter, label_matching,
+                      single_precision);
+          },
+          "Function for global RANSAC registration based on feature matching "
+          "of one source onto many targets, with one pair per thread",
+          "source"_a, "source_feature"_a, "targets"_a, "target_features"_a,
+          "max_correspondence_distance"_a,
+          "estimation_method"_a = TransformationEstimationPointToPoint(false),
+          "ransac_n"_a = 4,
+          "checkers"_a = std::vector<
+                  std::reference_wrapper<const CorrespondenceChecker>>(),
+          "criteria"_a = RANSACConvergenceCriteria(100000, 100),
+          "seed"_a = -1, "preemptive_subset_size"_a = 0,
+          "num_similar_features"_a = 1, "mutual_filter"_a = false,
+          "label_matching"_a = LabelMatching::Any,
+          "single_precision"_a = false);
+/*kimeguida*/
     m.def("registration_fast_based_on_feature_matching",
           &FastGlobalRegistration,
           "Function for fast global registration based on feature matching",
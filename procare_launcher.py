@@ -53,6 +53,54 @@
 
 
 
+import os
+import argparse
+import copy
+import types
+import functools
+import collections
+import multiprocessing
+import numpy as np
+from time import strftime, localtime
+
+from procare.open3d.open3d.geometry import PointCloud
+from procare.open3d.open3d.registration import Feature
+from procare.open3d.open3d.registration import registration_icp
+from procare.open3d.open3d.registration import registration_ransac_based_on_feature_matching
+from procare.open3d.open3d.registration import registration_ransac_based_on_feature_matching_batch
+from procare.open3d.open3d.registration import compute_normals_and_cfpfh_feature
+from procare.open3d.open3d.registration import compute_normals_and_cfpfh_feature_batch
+from procare.open3d.open3d.geometry import KDTreeSearchParamHybrid
+from procare.open3d.open3d.geometry import KDTreeFlann
+from procare.open3d.open3d.registration import CorrespondenceCheckerBasedOnEdgeLength
+from procare.open3d.open3d.registration import CorrespondenceCheckerBasedOnDistance
+from procare.open3d.open3d.registration import RANSACConvergenceCriteria
+from procare.open3d.open3d.registration import LabelMatching
+from procare.open3d.open3d.registration import ICPConvergenceCriteria
+from procare.open3d.open3d.registration import TransformationEstimationPointToPoint
+from procare.open3d.open3d.registration import TransformationEstimationPointToPlane
+
+from procare.convert import _volsite_cavity_
+from procare.featurecache import _feature_cache_
+from procare.library import _library_
+from procare.results import _tsv_sink_, _columnar_sink_, _top_k_
+from procare.procarescores import _ph4_ext_, _ph4_ext_bound_
+
+
+
+FUNCTIONS = {
+    'TransformationEstimationPointToPlane': TransformationEstimationPointToPlane,
+    'TransformationEstimationPointToPoint': TransformationEstimationPointToPoint 
+    #default: TransformationEstimationPointToPoint(with_scaling = False)
+    }
+
+LABEL_MATCHING = {
+    'any': LabelMatching.Any,
+    'identical': LabelMatching.Identical,
+    'compatible': LabelMatching.Compatible,
+    }
+
+
 
 def process_pointcloud(pointcloud_, radius_normal_, 
         radius_feature_, max_nn_normal_, max_nn_feature_):
@@ -60,17 +108,21 @@ def process_pointcloud(pointcloud_, radius_normal_,
     """This fuction estimates normals and calculate 
     the fast point feature histogramm"""
 
-    estimate_normals(pointcloud_, KDTreeSearchParamHybrid(
-               radius=radius_normal_, max_nn=max_nn_normal_)) 
-    cfpfh = compute_cfpfh_feature(pointcloud_, KDTreeSearchParamHybrid(
-               radius=radius_feature_, max_nn=max_nn_feature_))
+    # with equal radii, both stages share one neighbor search
+    cfpfh = compute_normals_and_cfpfh_feature(pointcloud_,
+        KDTreeSearchParamHybrid(radius=radius_normal_, max_nn=max_nn_normal_),
+        KDTreeSearchParamHybrid(radius=radius_feature_, 
+                                max_nn=max_nn_feature_))
     return cfpfh, pointcloud_
 
 
 
 def global_registration(source_, target_, cfpfh_source_, cfpfh_target_, 
         distance_threshold_, transformation_type_, n_ransac_, 
-        similarity_threshold_, max_iter_, max_valid_):
+        similarity_threshold_, max_iter_, max_valid_, confidence_=1.0,
+        max_time_=0.0, seed_=-1, subset_size_=0, num_similar_=1, 
+        mutual_filter_=False, label_matching_='any', 
+        target_trees_=(None, None), single_precision_=False):
 
     """Initial RANSAC alignement based of features"""
 
@@ -82,13 +134,46 @@ def global_registration(source_, target_, cfpfh_source_, cfpfh_target_,
         estimation_method=function_transtype(), ransac_n=n_ransac_,
         checkers=[CorrespondenceCheckerBasedOnEdgeLength(similarity_threshold_),
         CorrespondenceCheckerBasedOnDistance(distance_threshold_)],
-        criteria=RANSACConvergenceCriteria(max_iter_, max_valid_))
+        criteria=RANSACConvergenceCriteria(max_iter_, max_valid_,
+                                           confidence_, max_time_),
+        seed=seed_, preemptive_subset_size=subset_size_,
+        num_similar_features=num_similar_, mutual_filter=mutual_filter_,
+        label_matching=LABEL_MATCHING[label_matching_],
+        target_kdtree=target_trees_[0], target_feature_kdtree=target_trees_[1],
+        single_precision=single_precision_)
     return result 
 
 
 
+def global_registration_batch(source_, targets_, cfpfh_source_, 
+        cfpfh_targets_, distance_threshold_, transformation_type_, n_ransac_, 
+        similarity_threshold_, max_iter_, max_valid_, confidence_=1.0,
+        max_time_=0.0, seed_=-1, subset_size_=0, num_similar_=1, 
+        mutual_filter_=False, label_matching_='any', single_precision_=False):
+
+    """Initial RANSAC alignements of the source onto several targets,
+    one pair per thread"""
+
+    function_transtype = FUNCTIONS[transformation_type_]
+    results = registration_ransac_based_on_feature_matching_batch(source_, 
+        cfpfh_source_, targets_, cfpfh_targets_,
+        max_correspondence_distance=distance_threshold_,
+        estimation_method=function_transtype(), ransac_n=n_ransac_,
+        checkers=[CorrespondenceCheckerBasedOnEdgeLength(similarity_threshold_),
+        CorrespondenceCheckerBasedOnDistance(distance_threshold_)],
+        criteria=RANSACConvergenceCriteria(max_iter_, max_valid_,
+                                           confidence_, max_time_),
+        seed=seed_, preemptive_subset_size=subset_size_,
+        num_similar_features=num_similar_, mutual_filter=mutual_filter_,
+        label_matching=LABEL_MATCHING[label_matching_],
+        single_precision=single_precision_)
+    return results
+
+
+
 def fine_registration(source_, target_, result_ransac_, distance_threshold_, 
-        transformation_type_, relative_rmse_, relative_fitness_, max_iter_):
+        transformation_type_, relative_rmse_, relative_fitness_, max_iter_,
+        max_time_=0.0, target_kdtree_=None):
     
     function_transtype = FUNCTIONS[transformation_type_]
     # default TransformationEstimationPointToPoint: with_scaling = False
@@ -96,7 +181,9 @@ def fine_registration(source_, target_, result_ransac_, distance_threshold_,
         max_correspondence_distance=distance_threshold_,
         init=result_ransac_.transformation,
         estimation_method=function_transtype(),
-        criteria=ICPConvergenceCriteria(relative_fitness_, relative_rmse_, max_iter_))
+        criteria=ICPConvergenceCriteria(relative_fitness_, relative_rmse_, 
+                                        max_iter_, max_time_),
+        target_kdtree=target_kdtree_)
     return result
 
 
@@ -160,30 +247,803 @@ def transform_ligand(lig_mol2_, matrix_, ofile_):
 
 
 
-if __name__ == '__main__':
-  
-    from procare.open3d.open3d.registration import registration_icp
-    from procare.open3d.open3d.registration import registration_ransac_based_on_feature_matching
-    from procare.open3d.open3d.geometry import read_point_cloud
-    from procare.open3d.open3d.registration import compute_cfpfh_feature
-    from procare.open3d.open3d.geometry import estimate_normals
-    from procare.open3d.open3d.geometry import KDTreeSearchParamHybrid
-    from procare.open3d.open3d.registration import CorrespondenceCheckerBasedOnEdgeLength
-    from procare.open3d.open3d.registration import CorrespondenceCheckerBasedOnDistance
-    from procare.open3d.open3d.registration import RANSACConvergenceCriteria
-    from procare.open3d.open3d.registration import ICPConvergenceCriteria
-    from procare.open3d.open3d.registration import TransformationEstimationPointToPoint
-    from procare.open3d.open3d.registration import TransformationEstimationPointToPlane
-
-    from procare.convert import _volsite_cavity_
-    from procare.procarescores import _ph4_ext_
-
-    import os
-    import argparse
-    import copy
-    import numpy as np
-    from time import strftime, localtime
+def cavity_name(mol2_file_):
+    return os.path.splitext(os.path.basename(mol2_file_))[0]
+
+
+
+def load_cavity(mol2_file_):
+
+    """Reads a VolSite mol2 cavity into an Open3D point cloud.
+    Returns the cavity name, the point cloud, point properties and colors,
+    or -1 if the mol2 cannot be processed"""
+
+    cavity = _volsite_cavity_()
+    coordinates, properties, colors, labels = cavity.mol2_to_arrays(
+                                                                mol2_file_)
+    if properties is None:
+        return -1
+    # built in memory: same points and colors as through a pcd file,
+    # pharmacophore labels are given directly
+    pointcloud = PointCloud(coordinates, colors=cavity.pcd_rgb(colors),
+                            labels=labels)
+    return cavity_name(mol2_file_), pointcloud, properties, colors
+
+
+
+def list_targets(target_, targets_list_, targets_dir_):
+
+    """Lists target mol2 files from a single file, a list file 
+    (one mol2 path per line) or a directory"""
+
+    if target_ is not None:
+        return [target_]
+
+    if targets_list_ is not None:
+        targets = []
+        with open(targets_list_, 'r') as f:
+            for l in f:
+                l = l.strip()
+                if l == '' or l.startswith('#'):
+                    continue
+                targets.append(l)
+        return targets
+
+    return sorted([os.path.join(targets_dir_, f) 
+                    for f in os.listdir(targets_dir_) if f[-5:] == '.mol2'])
+
+
+
+def make_cache(args_):
+
+    """Feature cache of the run, None if no cache directory is given"""
+
+    if args_.cache_dir is None:
+        return None
+    return _feature_cache_(args_.cache_dir, {'normalrad': args_.normalrad,
+                                            'normalmaxn': args_.normalmaxn,
+                                            'featurerad': args_.featurerad,
+                                            'featuremaxn': args_.featuremaxn})
+
+
+
+def cached_cavity(mol2_file_, cache_):
+
+    """Processed cavity read from the feature cache, None if not cached"""
+
+    entry = cache_.load(mol2_file_)
+    if entry is None:
+        return None
+    properties = [[int(i), str(a)] for i, a in zip(entry['indices'],
+                                                   entry['atoms'])]
+    pointcloud, cfpfh, properties = rebuild_cavity(entry['points'],
+                                                   entry['normals'],
+                                                   entry['colors'],
+                                                   entry['cfpfh'],
+                                                   properties)
+    color = _volsite_cavity_().COLOR
+    colors = [color[atom] for index, atom in properties]
+    return cavity_name(mol2_file_), pointcloud, cfpfh, properties, colors
+
+
+
+def cache_cavity(mol2_file_, cache_, pointcloud_, cfpfh_, properties_):
+
+    """Stores a processed cavity in the feature cache"""
+
+    cache_.save(mol2_file_, points_=pointcloud_.points,
+                            colors_=pointcloud_.colors,
+                            normals_=pointcloud_.normals,
+                            cfpfh_=cfpfh_.data,
+                            indices_=[index for index, atom in properties_],
+                            atoms_=[atom for index, atom in properties_])
+
+
+
+def process_cavity(mol2_file_, args_, cache_=None):
+
+    """Loads a cavity and computes its normals and cfpfh, or reads them 
+    from the feature cache. Returns the cavity name, the point cloud, 
+    the cfpfh, point properties and colors, or -1"""
+
+    if cache_ is not None:
+        cavity = cached_cavity(mol2_file_, cache_)
+        if cavity is not None:
+            return cavity
+
+    cavity = load_cavity(mol2_file_)
+    if cavity == -1:
+        return -1
+    name, pointcloud, properties, colors = cavity
+
+    cfpfh, pointcloud = process_pointcloud(pointcloud_=pointcloud,
+                                         radius_normal_=args_.normalrad,
+                                         radius_feature_=args_.featurerad,
+                                         max_nn_normal_=args_.normalmaxn,
+                                         max_nn_feature_=args_.featuremaxn)
+
+    if cache_ is not None:
+        cache_cavity(mol2_file_, cache_, pointcloud, cfpfh, properties)
+
+    return name, pointcloud, cfpfh, properties, colors
+
+
+
+def process_cavities(mol2_files_, args_, cache_=None):
+
+    """process_cavity() of many cavities: normals and cfpfh of cavities
+    not in the cache are computed in one call, one cavity per thread.
+    Returns the processed cavities in order, unreadable ones are skipped"""
+
+    cavities = {}
+    loaded = []
+    for i, mol2_file in enumerate(mol2_files_):
+        if cache_ is not None:
+            cavity = cached_cavity(mol2_file, cache_)
+            if cavity is not None:
+                cavities[i] = cavity
+                continue
+        cavity = load_cavity(mol2_file)
+        if cavity != -1:
+            loaded.append((i, mol2_file, cavity))
+
+    if loaded:
+        cfpfhs = compute_normals_and_cfpfh_feature_batch(
+            [pointcloud for _, _, (_, pointcloud, _, _) in loaded],
+            KDTreeSearchParamHybrid(radius=args_.normalrad, 
+                                    max_nn=args_.normalmaxn),
+            KDTreeSearchParamHybrid(radius=args_.featurerad, 
+                                    max_nn=args_.featuremaxn))
+        for (i, mol2_file, cavity), cfpfh in zip(loaded, cfpfhs):
+            name, pointcloud, properties, colors = cavity
+            if cache_ is not None:
+                cache_cavity(mol2_file, cache_, pointcloud, cfpfh, properties)
+            cavities[i] = name, pointcloud, cfpfh, properties, colors
+
+    return [cavities[i] for i in sorted(cavities)]
+
+
+
+def library_cavity(library_, i_):
+
+    """Cavity at position i_ of a library, as returned by process_cavity"""
+
+    entry = library_.get(i_)
+    properties = library_.properties(i_)
+    cavity = _volsite_cavity_()
+    colors = [cavity.COLOR[atom] for index, atom in properties]
+    pointcloud, cfpfh, properties = rebuild_cavity(
+                                    np.asarray(entry['points'], dtype=np.float64),
+                                    np.asarray(entry['normals'], dtype=np.float64),
+                                    cavity.pcd_rgb(colors),
+                                    np.asarray(entry['cfpfh'], dtype=np.float64).T,
+                                    properties)
+    return entry['name'], pointcloud, cfpfh, properties, colors
+
+
+
+def make_trees(pointcloud_, cfpfh_, single_precision_=False):
+
+    """KD-trees of a target: points and cfpfh. They are only read by the 
+    registrations and can be reused for all sources aligned onto it.
+    With single_precision_, trees store float32 copies of the data"""
+
+    return (KDTreeFlann(pointcloud_, single_precision=single_precision_), 
+            KDTreeFlann(cfpfh_, single_precision=single_precision_))
+
+
+
+def align(source_, target_, cfpfh_source_, cfpfh_target_, args_, 
+                                                        target_trees_=None):
+
+    """RANSAC then ICP alignment of the source onto the target.
+    Returns both registration results and the transformed source"""
+
+    if target_trees_ is None:
+        target_trees_ = make_trees(target_, cfpfh_target_, args_.float32)
+
+    result_global = global_registration(source_=source_,
+                                        target_=target_,
+                                        cfpfh_source_=cfpfh_source_,
+                                        cfpfh_target_=cfpfh_target_,
+                                        distance_threshold_=args_.globaldist,
+                                        transformation_type_=args_.globaltranstype,
+                                        n_ransac_=args_.ransacn,
+                                        similarity_threshold_=args_.checkersim,
+                                        max_iter_=args_.ransaciter,
+                                        max_valid_=args_.ransacvalid,
+                                        confidence_=args_.ransacconf,
+                                        max_time_=args_.ransactime,
+                                        seed_=args_.seed,
+                                        subset_size_=args_.ransacsubset,
+                                        num_similar_=args_.ransacknn,
+                                        mutual_filter_=args_.ransacmutual,
+                                        label_matching_=args_.ransaclabels,
+                                        target_trees_=target_trees_,
+                                        single_precision_=args_.float32)
+
+    result_fine = fine_registration(source_=source_,
+                                    target_=target_,
+                                    result_ransac_=result_global,
+                                    distance_threshold_=args_.icpdist,
+                                    transformation_type_=args_.icptranstype,
+                                    relative_rmse_=args_.icprmse,
+                                    relative_fitness_=args_.icpfitness,
+                                    max_iter_=args_.icpiter,
+                                    max_time_=args_.icptime,
+                                    target_kdtree_=target_trees_[0])
+
+    source_transformed = copy.deepcopy(source_)
+    source_transformed.transform(result_fine.transformation)
+    return result_global, result_fine, source_transformed
+
+
+
+def align_batch(source_, targets_, cfpfh_source_, cfpfh_targets_, args_):
+
+    """align() of the source onto several targets: RANSAC alignments run 
+    in one native call, one pair per thread, then ICP per pair"""
+
+    if len(targets_) == 1:
+        return [align(source_, targets_[0], cfpfh_source_, cfpfh_targets_[0], 
+                                                                    args_)]
+
+    results_global = global_registration_batch(source_=source_,
+                                    targets_=targets_,
+                                    cfpfh_source_=cfpfh_source_,
+                                    cfpfh_targets_=cfpfh_targets_,
+                                    distance_threshold_=args_.globaldist,
+                                    transformation_type_=args_.globaltranstype,
+                                    n_ransac_=args_.ransacn,
+                                    similarity_threshold_=args_.checkersim,
+                                    max_iter_=args_.ransaciter,
+                                    max_valid_=args_.ransacvalid,
+                                    confidence_=args_.ransacconf,
+                                    max_time_=args_.ransactime,
+                                    seed_=args_.seed,
+                                    subset_size_=args_.ransacsubset,
+                                    num_similar_=args_.ransacknn,
+                                    mutual_filter_=args_.ransacmutual,
+                                    label_matching_=args_.ransaclabels,
+                                    single_precision_=args_.float32)
+
+    aligned = []
+    for target, result_global in zip(targets_, results_global):
+        result_fine = fine_registration(source_=source_,
+                                        target_=target,
+                                        result_ransac_=result_global,
+                                        distance_threshold_=args_.icpdist,
+                                        transformation_type_=args_.icptranstype,
+                                        relative_rmse_=args_.icprmse,
+                                        relative_fitness_=args_.icpfitness,
+                                        max_iter_=args_.icpiter,
+                                        max_time_=args_.icptime,
+                                        target_kdtree_=KDTreeFlann(target, 
+                                            single_precision=args_.float32))
+        source_transformed = copy.deepcopy(source_)
+        source_transformed.transform(result_fine.transformation)
+        aligned.append((result_global, result_fine, source_transformed))
+    return aligned
+
+
+
+def score(source_transformed_, target_, source_prop_, target_prop_):
+
+    """Tversky score and pharmacophore contributions of aligned cavities.
+    Contributions are returned in output order: 
+    CA, CZ, O, N, OD1, OG, NZ, DU"""
+
+    ph4_ext = _ph4_ext_(source_transformed_.points, target_.points, 
+                                        source_prop_, target_prop_, 1.5)
+
+    ratio_aligned, ratio_CA_in_aligned, \
+        ratio_CZ_in_aligned, ratio_N_in_aligned, \
+        ratio_NZ_in_aligned, ratio_O_in_aligned, \
+        ratio_OD1_in_aligned, ratio_OG_in_aligned, \
+        ratio_DU_in_aligned = ph4_ext.get_similarity_by_rules()
+
+    contributions = [ratio_CA_in_aligned,
+                     ratio_CZ_in_aligned,
+                     ratio_O_in_aligned,
+                     ratio_N_in_aligned,
+                     ratio_OD1_in_aligned,
+                     ratio_OG_in_aligned,
+                     ratio_NZ_in_aligned,
+                     ratio_DU_in_aligned]
+
+    return ph4_ext.tversky_similarity(), contributions
+
+
+
+def make_sink(args_):
+
+    """Result output of the run: tab-separated files, or binary columns 
+    in the <output>_columns directory"""
+
+    if args_.output_format == 'columnar':
+        return _columnar_sink_('{}_columns'.format(
+                                    os.path.splitext(args_.output)[0]),
+                               args_.flush_every)
+    return _tsv_sink_(args_.output, args_.scoreoutput, args_.flush_every)
+
+
+
+def completed_pairs(sink_, args_):
+
+    """Pairs already computed for the run parameter id"""
+
+    completed = sink_.completed(args_.paramid)
+    print("resume: {} pairs already computed".format(len(completed)))
+    return completed
+
+
+
+def one_vs_many(args_):
+
+    """Compares the source to each target: the source is processed once
+    and targets are streamed"""
+
+    library = None
+    if args_.library is not None:
+        library = _library_(args_.library)
+        # the source is processed as the library cavities were
+        for param, value in library.params.items():
+            if getattr(args_, param) != value:
+                print("using library {}: {}".format(param, value))
+                setattr(args_, param, value)
+
+    cache = make_cache(args_)
+    source = process_cavity(args_.source, args_, cache)
+    if source == -1:
+        return -1
+    source_name, source, source_cfpfh, source_prop, source_color = source
+
+    sink = make_sink(args_)
+    completed = completed_pairs(sink, args_) if args_.resume else set()
+    # targets as (name, properties, processed cavity) loaded on demand
+    if library is not None:
+        targets = ((library.names[i], 
+                    functools.partial(library.properties, i),
+                    functools.partial(library_cavity, library, i))
+                        for i in range(len(library)))
+    else:
+        targets = ((cavity_name(target_file),
+                    functools.partial(mol2_properties, target_file),
+                    functools.partial(process_cavity, target_file, args_, cache))
+                        for target_file in list_targets(args_.target, 
+                                                        args_.targets_list, 
+                                                        args_.targets_dir))
+    # with several targets, transformed files are prefixed with the target name
+    multi_targets = args_.target is None
+
+    hits = _top_k_(args_.top_k) if args_.top_k is not None else None
+    pruning = hits is not None or args_.score_threshold is not None
+    pruned = 0
+
+    def output_batch(targets_):
+        aligned = align_batch(source, [t[1] for t in targets_], source_cfpfh, 
+                                    [t[2] for t in targets_], args_)
+        for target, alignment in zip(targets_, aligned):
+            target_name, target, target_cfpfh, target_prop, target_color = target
+            result_global_cfpfh, result_fine_cfpfh, \
+                source_transformed_cfpfh = alignment
+
+            report_timeout(source_name, target_name, 
+                           result_global_cfpfh, result_fine_cfpfh)
+
+            pair_score, contributions = score(source_transformed_cfpfh, 
+                                        target, source_prop, target_prop)
+
+            if not retained(pair_score, hits, args_):
+                continue
+
+            hit = make_hit(source_name, target_name, args_.classification,
+                           pair_score, contributions, 
+                           result_global_cfpfh, result_fine_cfpfh,
+                           source_transformed_cfpfh if args_.transform else None,
+                           source_color)
+            prefix = 'cfpfh_{}_'.format(target_name) if multi_targets \
+                                                                else 'cfpfh_'
+            if hits is not None:
+                hits.push(pair_score, (prefix, hit))
+            else:
+                write_hit(sink, args_, hit, prefix, args_.ligandtransform)
+
+    # targets are aligned by batches of --batch targets
+    batch = []
+    for target_name, target_prop, target in targets:
+
+        if (source_name, target_name) in completed:
+            continue
+
+        # pairs that cannot be output are not aligned
+        if pruning:
+            target_prop = target_prop()
+            if target_prop is None:
+                continue
+            if not retained(score_upper_bound(source_prop, target_prop), 
+                                                                hits, args_):
+                pruned += 1
+                continue
+
+        target = target()
+        if target == -1:
+            continue
+        batch.append(target)
+        if len(batch) == args_.batch:
+            output_batch(batch)
+            batch = []
+    if batch:
+        output_batch(batch)
+
+    if hits is not None:
+        for prefix, hit in hits.best():
+            write_hit(sink, args_, hit, prefix, args_.ligandtransform)
+
+    sink.close()
+    if pruning:
+        print("pruned {} pairs by score upper bound".format(pruned))
+
+
+
+def report_timeout(source_name_, target_name_, result_global_, 
+                                                        result_fine_):
+
+    """Reports pairs whose registration was stopped by the time budget
+    (-rt, -im): their alignment may be suboptimal"""
+
+    stopped = [step for step, result in (('ransac', result_global_), 
+                                         ('icp', result_fine_))
+                    if result.timed_out]
+    if stopped:
+        print("time budget exceeded: {} {} ({})".format(source_name_, 
+                                        target_name_, ', '.join(stopped)))
+
+
+
+def mol2_properties(mol2_file_):
+
+    """Point properties of a mol2 cavity, None if it cannot be read"""
+
+    return _volsite_cavity_().mol2_to_arrays(mol2_file_)[1]
+
+
+
+def score_upper_bound(source_prop_, target_prop_):
+
+    """Highest score a pair can reach, whatever the alignment: 
+    computed from point properties only"""
+
+    return _ph4_ext_bound_(source_prop_, target_prop_).tversky_similarity()
+
+
+
+def retained(score_, hits_, args_):
+
+    """Whether a pair is output: above the score threshold, if any, and 
+    among the best pairs so far when only the top-k pairs are kept"""
+
+    if args_.score_threshold is not None and score_ < args_.score_threshold:
+        return False
+    return hits_ is None or hits_.admits(score_)
+
+
+
+def make_hit(source_name_, target_name_, classification_, score_, 
+        contributions_, result_global_, result_fine_, source_transformed_,
+        source_color_):
+
+    """Output data of a pair, detached from Open3D objects: it can be kept 
+    until the end of the run or sent back from a worker process"""
+
+    summaries = [types.SimpleNamespace(fitness=r.fitness,
+                                       inlier_rmse=r.inlier_rmse,
+                                       timed_out=r.timed_out,
+                                       transformation=np.array(r.transformation))
+                    for r in (result_global_, result_fine_)]
+    coords = None
+    if source_transformed_ is not None:
+        coords = np.array(source_transformed_.points)
+    return types.SimpleNamespace(source_name=source_name_,
+                                 target_name=target_name_,
+                                 classification=classification_,
+                                 score=score_,
+                                 contributions=contributions_,
+                                 result_global=summaries[0],
+                                 result_fine=summaries[1],
+                                 transformed_coords=coords,
+                                 source_color=source_color_)
+
+
 
+def write_hit(sink_, args_, hit_, prefix_, ligands_=None):
+
+    """Outputs a pair: result rows and, if requested, transformed files"""
+
+    if hit_.transformed_coords is not None:
+        transform(mol2_ofile_='{}{}.mol2'.format(prefix_, hit_.source_name),
+                  transformed_coords_=hit_.transformed_coords,
+                  source_color_=hit_.source_color)
+
+    if ligands_ is not None:
+        for molecule in ligands_:
+            lig = os.path.basename(molecule)
+            transform_ligand(molecule,
+                             hit_.result_fine.transformation,
+                             '{}{}'.format(prefix_, lig))
+
+    sink_.add(paramid_=args_.paramid,
+              classification_=hit_.classification,
+              source_name_=hit_.source_name,
+              target_name_=hit_.target_name,
+              score_=hit_.score,
+              contributions_=hit_.contributions,
+              result_global_=hit_.result_global,
+              result_fine_=hit_.result_fine)
+
+
+
+def featurize(mol2_files_, args_):
+
+    """Loads and processes each cavity once. Cavities are returned as 
+    arrays (points, normals, colors, cfpfh, properties) so that they can 
+    be sent to worker processes"""
+
+    names = []
+    cavities = []
+    for cavity in process_cavities(mol2_files_, args_, make_cache(args_)):
+        name, pointcloud, cfpfh, properties, colors = cavity
+        names.append(name)
+        cavities.append((np.array(pointcloud.points),
+                         np.array(pointcloud.normals),
+                         np.array(pointcloud.colors),
+                         np.array(cfpfh.data),
+                         properties))
+    return names, cavities
+
+
+
+def rebuild_cavity(points_, normals_, colors_, cfpfh_, properties_):
+
+    """Rebuilds a processed point cloud and its cfpfh from arrays"""
+
+    pointcloud = PointCloud(points_, normals_, colors_,
+                            _volsite_cavity_().labels(properties_))
+    cfpfh = Feature(cfpfh_)
+    return pointcloud, cfpfh, properties_
+
+
+
+def schedule_pairs(n_, pairs_):
+
+    """Pair tasks grouped by source row: (i, [j, ...]).
+    'ordered' schedules all i != j, 'upper' and 'mirror' only i < j"""
+
+    tasks = []
+    for i in range(n_):
+        if pairs_ == 'ordered':
+            js = [j for j in range(n_) if j != i]
+        else:
+            js = list(range(i+1, n_))
+        if js:
+            tasks.append((i, js))
+    return tasks
+
+
+
+def make_pool(nproc_, omp_threads_, initializer_, initargs_):
+
+    """Spawn process pool. OpenMP reads OMP_NUM_THREADS when it is loaded:
+    it is set in the environment inherited by the workers so that 
+    processes x threads matches the available cores"""
+
+    if omp_threads_ is None:
+        omp_threads_ = max(1, os.cpu_count() // nproc_)
+    os.environ['OMP_NUM_THREADS'] = str(omp_threads_)
+    # spawn: forking after OpenMP has been used in the parent is not safe
+    context = multiprocessing.get_context('spawn')
+    return context.Pool(nproc_, initializer=initializer_, initargs=initargs_)
+
+
+
+# worker process state, set once by the pool initializer
+_WORKER = {}
+
+def _init_all_vs_all_worker(names_, cavities_, args_):
+    _WORKER['args'] = args_
+    _WORKER['names'] = names_
+    _WORKER['cavities'] = [rebuild_cavity(*c) for c in cavities_]
+    # each cavity is a target of many pairs: its trees are built once
+    _WORKER['trees'] = [make_trees(pointcloud, cfpfh, args_.float32) 
+                            for pointcloud, cfpfh, _ in _WORKER['cavities']]
+
+
+
+def _all_vs_all_row(task_):
+    i, js = task_
+    args = _WORKER['args']
+    source, source_cfpfh, source_prop = _WORKER['cavities'][i]
+    scores = []
+    for j in js:
+        target, target_cfpfh, target_prop = _WORKER['cavities'][j]
+        result_global, result_fine, source_transformed = align(source, 
+                                    target, source_cfpfh, target_cfpfh, args,
+                                    _WORKER['trees'][j])
+        report_timeout(_WORKER['names'][i], _WORKER['names'][j], 
+                       result_global, result_fine)
+        pair_score, contributions = score(source_transformed, target, 
+                                          source_prop, target_prop)
+        scores.append(pair_score)
+    return i, js, scores
+
+
+
+def all_vs_all(args_):
+
+    """Compares all cavities of a list to each other. Scores are written
+    to a (n, n) .npy matrix, rows are sources and columns targets;
+    pairs not computed are NaN. Cavity names are written, in matrix 
+    order, to a .list file next to the matrix"""
+
+    names, cavities = featurize(list_targets(None, args_.all_vs_all, None), 
+                                                                        args_)
+    n = len(names)
+
+    # the matrix is filled on disk: large sets do not need to fit in memory
+    matrix = np.lib.format.open_memmap(args_.matrix, mode='w+', 
+                                            dtype=np.float64, shape=(n, n))
+    matrix[:] = np.nan
+
+    tasks = schedule_pairs(n, args_.pairs)
+    pool = make_pool(args_.nproc, args_.omp_threads,
+                     _init_all_vs_all_worker, (names, cavities, args_))
+    with pool:
+        for i, js, scores in pool.imap_unordered(_all_vs_all_row, tasks):
+            matrix[i, js] = scores
+            if args_.pairs == 'mirror':
+                matrix[js, i] = scores
+    matrix.flush()
+
+    with open('{}.list'.format(os.path.splitext(args_.matrix)[0]), 'w') as of:
+        of.write('\n'.join(names) + '\n')
+
+
+
+def list_pairs(pairs_list_):
+
+    """Reads pairs from a file: source and target mol2 files per line, 
+    optionally followed by the class (0 or 1)"""
+
+    pairs = []
+    with open(pairs_list_, 'r') as f:
+        for l in f:
+            cols = l.split()
+            if len(cols) < 2 or cols[0].startswith('#'):
+                continue
+            classification = cols[2] if len(cols) > 2 else None
+            pairs.append((cols[0], cols[1], classification))
+    return pairs
+
+
+
+def _init_pairs_worker(args_):
+    _WORKER['args'] = args_
+    _WORKER['feature_cache'] = make_cache(args_)
+    # parsed and processed cavities with their KD-trees, 
+    # least recently used evicted first
+    _WORKER['cache'] = collections.OrderedDict()
+
+
+
+def _cached_cavity(mol2_file_):
+    cache = _WORKER['cache']
+    if mol2_file_ in cache:
+        cache.move_to_end(mol2_file_)
+        return cache[mol2_file_]
+
+    args = _WORKER['args']
+    cavity = process_cavity(mol2_file_, args, _WORKER['feature_cache'])
+    trees = None
+    if cavity != -1:
+        trees = make_trees(cavity[1], cavity[2], args.float32)
+    cache[mol2_file_] = cavity, trees
+    if len(cache) > args.cache_size:
+        cache.popitem(last=False)
+    return cavity, trees
+
+
+
+def _pair(task_):
+    source_file, target_file, classification = task_
+    args = _WORKER['args']
+    source, _ = _cached_cavity(source_file)
+    target, target_trees = _cached_cavity(target_file)
+    if source == -1 or target == -1:
+        return None
+    source_name, source, source_cfpfh, source_prop, source_color = source
+    target_name, target, target_cfpfh, target_prop, target_color = target
+
+    result_global, result_fine, source_transformed = align(source, target, 
+                                        source_cfpfh, target_cfpfh, args,
+                                        target_trees)
+    report_timeout(source_name, target_name, result_global, result_fine)
+
+    pair_score, contributions = score(source_transformed, target, 
+                                      source_prop, target_prop)
+
+    if args.score_threshold is not None and pair_score < args.score_threshold:
+        return None
+
+    if classification is None:
+        classification = args.classification
+    # transformed files are written by the parent, for retained pairs only
+    return make_hit(source_name, target_name, classification, pair_score, 
+                    contributions, result_global, result_fine,
+                    source_transformed if args.transform else None,
+                    source_color)
+
+
+
+def prune_pairs(tasks_, score_threshold_):
+
+    """Removes pairs whose score upper bound is below the threshold"""
+
+    properties = {}
+    kept = []
+    for task in tasks_:
+        for mol2_file in task[:2]:
+            if mol2_file not in properties:
+                properties[mol2_file] = mol2_properties(mol2_file)
+        source_prop = properties[task[0]]
+        target_prop = properties[task[1]]
+        # unreadable cavities are reported by the workers
+        if source_prop is None or target_prop is None \
+                or score_upper_bound(source_prop, target_prop) \
+                                                    >= score_threshold_:
+            kept.append(task)
+    print("pruned {} pairs by score upper bound".format(
+                                                    len(tasks_) - len(kept)))
+    return kept
+
+
+
+def pairs(args_):
+
+    """Compares the pairs of a pairs list over a process pool. Workers 
+    keep a cache of processed cavities: pairs sharing cavities are best 
+    listed next to each other"""
+
+    tasks = list_pairs(args_.pairs_list)
+    sink = make_sink(args_)
+    if args_.resume:
+        completed = completed_pairs(sink, args_)
+        tasks = [task for task in tasks 
+                    if (cavity_name(task[0]), cavity_name(task[1])) 
+                                                            not in completed]
+    if args_.score_threshold is not None:
+        tasks = prune_pairs(tasks, args_.score_threshold)
+    pool = make_pool(args_.nproc, args_.omp_threads,
+                     _init_pairs_worker, (args_,))
+    hits = _top_k_(args_.top_k) if args_.top_k is not None else None
+    with pool:
+        for hit in pool.imap_unordered(_pair, tasks, chunksize=8):
+            if hit is None or not retained(hit.score, hits, args_):
+                continue
+            prefix = 'cfpfh_{}_'.format(hit.target_name)
+            if hits is not None:
+                hits.push(hit.score, (prefix, hit))
+            else:
+                write_hit(sink, args_, hit, prefix)
+
+    if hits is not None:
+        for prefix, hit in hits.best():
+            write_hit(sink, args_, hit, prefix)
+
+    sink.close()
+
+
+
+if __name__ == '__main__':
 
     parser = argparse.ArgumentParser(description='Parameters for ProCare')
 
@@ -198,6 +1058,50 @@ if __name__ == '__main__':
         required=False,
         default=4000000)
 
+    parser.add_argument('-rc', '--ransacconf', type=float,
+        help='RANSAC convergence criteria: stop once an all-inlier sample '
+             'has been drawn with this probability (e.g. 0.999), '
+             'given the best fitness so far; 1.0 disables it',
+        required=False,
+        default=1.0)
+
+    parser.add_argument('-rt', '--ransactime', type=float,
+        help='RANSAC convergence criteria: time budget in seconds, the best '
+             'alignment found is kept when it expires; 0 for no budget',
+        required=False,
+        default=0.0)
+
+    parser.add_argument('-rk', '--ransacknn', type=int,
+        help='RANSAC: number of most similar target points (cfpfh) '
+             'a source point can be paired with', 
+        required=False,
+        default=1)
+
+    parser.add_argument('-rm', '--ransacmutual', action='store_true',
+        help='RANSAC: pair points only if each is among the most similar '
+             'of the other (mutual nearest cfpfh)',
+        required=False)
+
+    parser.add_argument('-rl', '--ransaclabels', type=str,
+        help='RANSAC: pharmacophore labels of paired points, any, identical '
+             'or compatible (CA~CZ; O~OD1~OG; N~NZ~OG; DU~DU)',
+        choices=list(LABEL_MATCHING),
+        required=False,
+        default='any')
+
+    parser.add_argument('-rs', '--ransacsubset', type=int,
+        help='RANSAC: number of random points on which an alignment is '
+             'first scored, it is fully scored only if it can beat the best '
+             'alignment so far; 0 to always fully score alignments',
+        required=False,
+        default=0)
+
+    parser.add_argument('--seed', type=int,
+        help='RANSAC random seed: with a seed, alignments are reproducible '
+             'for a given number of OpenMP threads; -1 for a random seed',
+        required=False,
+        default=-1)
+
     parser.add_argument('-rn', '--ransacn', type=int,
         help='RANSAC: number of pairs to validate at each iteration', 
         required=False,
@@ -246,6 +1150,12 @@ if __name__ == '__main__':
         required=False,
         default=100)
 
+    parser.add_argument('-im', '--icptime', type=float,
+        help='ICP convergence criteria: time budget in seconds, the current '
+             'alignment is kept when it expires; 0 for no budget',
+        required=False,
+        default=0.0)
+
     # normals
     parser.add_argument('-nr', '--normalrad', type=float,
         help='Radius for local surface normal estimation on a point', 
@@ -270,6 +1180,11 @@ if __name__ == '__main__':
         required=False,
         default=135)
 
+    parser.add_argument('--float32', action='store_true',
+        help=('Single precision (float32) KD-trees of points and cfpfh for '
+              'RANSAC and ICP searches: half the memory of the search index'), 
+        required=False)
+
     # output
     parser.add_argument('-o', '--output', type=str,
         help='Complete output file', 
@@ -286,6 +1201,35 @@ if __name__ == '__main__':
         required=False,
         default='default')
 
+    parser.add_argument('--output-format', type=str,
+        help=('Output format: tab-separated files, or binary columns '
+              '(procare.results.load_columnar) in the <output>_columns '
+              'directory'),
+        choices=['tsv', 'columnar'],
+        required=False,
+        default='tsv')
+
+    parser.add_argument('--top-k', type=int,
+        help=('Multiple pairs: output only the k best scored pairs, '
+              'at the end of the run'),
+        required=False,
+        default=None)
+
+    parser.add_argument('--score-threshold', type=float,
+        help='Multiple pairs: output only pairs scoring at least this value',
+        required=False,
+        default=None)
+
+    parser.add_argument('--resume', action='store_true',
+        help=('Skip pairs already in the complete output file for the '
+              'parameter id (-p), after repairing an interrupted output'),
+        required=False)
+
+    parser.add_argument('--flush-every', type=int,
+        help='Number of pairs written to output files at once',
+        required=False,
+        default=1)
+
     parser.add_argument('-c', '--classification', type=str,
         help='Class for retrospective screening: 0 or 1',
         choices=['0', '1'],
@@ -300,205 +1244,124 @@ if __name__ == '__main__':
         help='output rotated ligand and/or protein mol2', 
         required=False)
 
+    # feature cache
+    parser.add_argument('--cache-dir', type=str,
+        help=('Directory of cached normals and cfpfh, keyed by mol2 content '
+              'and normal/feature parameters'),
+        required=False,
+        default=None)
+
     # inputs
     parser.add_argument('-s', '--source', type=str,
         help='Source mol2 file', 
-        required=True)
-
-    parser.add_argument('-t', '--target', type=str,
-        help='Target mol2 file', 
-        required=True)
-
-    args = parser.parse_args()
-
-
-    FUNCTIONS = {
-    'TransformationEstimationPointToPlane': TransformationEstimationPointToPlane,
-    'TransformationEstimationPointToPoint': TransformationEstimationPointToPoint 
-    #default: TransformationEstimationPointToPoint(with_scaling = False)
-    }
-
+        required=False)
 
-    # sequential loading: sourcefile and target files can have the same file names
-    source_cavity = _volsite_cavity_()
-    source_file, source_prop, source_color = source_cavity.mol2_to_pcd(args.source)
-    if source_file != -1:
-        source = read_point_cloud(source_file)
+    targets = parser.add_mutually_exclusive_group(required=True)
+    targets.add_argument('-t', '--target', type=str,
+        help='Target mol2 file')
 
+    targets.add_argument('--targets-list', type=str,
+        help=('File listing target mol2 files, one per line: the source '
+              'is processed once and compared to each target'))
 
-    target_cavity = _volsite_cavity_()
-    target_file, target_prop, target_color = target_cavity.mol2_to_pcd(args.target)
-    if target_file != -1:
-        target = read_point_cloud(target_file)
+    targets.add_argument('--targets-dir', type=str,
+        help=('Directory of target mol2 files: the source '
+              'is processed once and compared to each target'))
 
+    targets.add_argument('--library', type=str,
+        help=('Library of processed cavities (python -m procare.library): '
+              'the source is compared to each library cavity'))
 
-    if source_file and target_file != -1:
+    targets.add_argument('--all-vs-all', type=str,
+        help=('File listing mol2 files, one per line: all cavities are '
+              'compared to each other, output is a score matrix (--matrix)'))
 
-        source_cfpfh, source = process_pointcloud(pointcloud_=source,
-                                             radius_normal_=args.normalrad,
-                                             radius_feature_=args.featurerad,
-                                             max_nn_normal_=args.normalmaxn,
-                                         max_nn_feature_=args.featuremaxn)
+    targets.add_argument('--pairs-list', type=str,
+        help=('File listing pairs: source and target mol2 files per line, '
+              'optionally followed by the class. Pairs are distributed over '
+              '--nproc processes'))
 
-        target_cfpfh, target = process_pointcloud(pointcloud_=target,
-                                         radius_normal_=args.normalrad,
-                                         radius_feature_=args.featurerad,
-                                         max_nn_normal_=args.normalmaxn,
-                                         max_nn_feature_=args.featuremaxn)
+    # all-vs-all
+    parser.add_argument('--pairs', type=str,
+        help=('All-vs-all pairs: all ordered pairs, upper triangle only, '
+              'or upper triangle mirrored to the lower one'),
+        choices=['ordered', 'upper', 'mirror'],
+        required=False,
+        default='ordered')
 
+    parser.add_argument('--matrix', type=str,
+        help='All-vs-all score matrix output file (.npy)',
+        required=False,
+        default='procare_matrix.npy')
 
-        result_global_cfpfh = global_registration(source_=source,
-                                            target_=target,
-                                            cfpfh_source_=source_cfpfh,
-                                            cfpfh_target_=target_cfpfh,
-                                            distance_threshold_=args.globaldist,
-                                            transformation_type_=args.globaltranstype,
-                                            n_ransac_=args.ransacn,
-                                            similarity_threshold_=args.checkersim,
-                                            max_iter_=args.ransaciter,
-                                            max_valid_=args.ransacvalid)
+    # process pool
+    parser.add_argument('--nproc', type=int,
+        help='All-vs-all and pairs list: number of worker processes',
+        required=False,
+        default=os.cpu_count())
 
-        result_fine_cfpfh = fine_registration(source_=source,
-                                        target_=target,
-                                        result_ransac_=result_global_cfpfh,
-                                        distance_threshold_=args.icpdist,
-                                        transformation_type_=args.icptranstype,
-                                        relative_rmse_=args.icprmse,
-                                        relative_fitness_=args.icpfitness,
-                                        max_iter_=args.icpiter)
+    parser.add_argument('--omp-threads', type=int,
+        help=('All-vs-all and pairs list: OpenMP threads per worker process, '
+              'default: number of cores / --nproc'),
+        required=False,
+        default=None)
 
-        source_transformed_cfpfh = copy.deepcopy(source)
-        source_transformed_cfpfh.transform(result_fine_cfpfh.transformation)
-        #print(source_transformed_cfpfh)
+    parser.add_argument('--cache-size', type=int,
+        help='Pairs list: number of processed cavities kept by each worker',
+        required=False,
+        default=256)
 
-        
+    parser.add_argument('--batch', type=int,
+        help='One source vs many targets: number of targets aligned in one '
+             'native call, RANSAC then running one pair per OpenMP thread '
+             'instead of one pair over all threads',
+        required=False,
+        default=1)
 
-        if args.transform:
-            rot_file_cfpfh = 'cfpfh_{}.mol2'.format(os.path.splitext(source_file)[0])
-            transform(mol2_ofile_=rot_file_cfpfh,
-                        transformed_coords_=source_transformed_cfpfh.points,
-                        source_color_=source_color)
+    args = parser.parse_args()
 
+    if args.resume and (args.top_k is not None 
+                            or args.score_threshold is not None):
+        parser.error('--resume cannot be used with --top-k and '
+                     '--score-threshold: pairs not output are not recorded')
+
+    if not 0.0 < args.ransacconf <= 1.0:
+        parser.error('-rc/--ransacconf must be in ]0, 1]')
+    if args.batch < 1:
+        parser.error('--batch must be at least 1')
+    if args.ransacknn < 1:
+        parser.error('-rk/--ransacknn must be at least 1')
+    if args.ransacsubset < 0:
+        parser.error('-rs/--ransacsubset must be positive')
+    if args.ransactime < 0 or args.icptime < 0:
+        parser.error('-rt/--ransactime and -im/--icptime must be positive')
+
+    if args.all_vs_all is not None or args.pairs_list is not None:
+        if args.source is not None:
+            parser.error('-s/--source is not used with --all-vs-all '
+                         'and --pairs-list')
+        # ligands are transformed with the alignment of the -s source
         if args.ligandtransform is not None:
-            for molecule in args.ligandtransform:
-                lig = os.path.basename(molecule)
-                cfpfh_lig = 'cfpfh_{}'.format(lig)
-                transform_ligand(molecule,
-                            result_fine_cfpfh.transformation,
-                            cfpfh_lig)
-
-        
-        ph4_ext = _ph4_ext_(source_transformed_cfpfh.points, target.points, 
-                                            source_prop, target_prop, 1.5)
-
-        ratio_aligned, ratio_CA_in_aligned, \
-            ratio_CZ_in_aligned, ratio_N_in_aligned, \
-            ratio_NZ_in_aligned, ratio_O_in_aligned, \
-            ratio_OD1_in_aligned, ratio_OG_in_aligned, \
-            ratio_DU_in_aligned = ph4_ext.get_similarity_by_rules()
-
-        score = ph4_ext.tversky_similarity()
-
-        if not os.path.isfile(args.scoreoutput):
-            with open(args.scoreoutput, "w") as of:
-                of.write("Source\tTarget\tScore\n")
-
-        with open(args.scoreoutput, 'a') as of:
-            of.write("{}\t{}\t{}\n".format(os.path.splitext(source_file)[0],
-                                           os.path.splitext(target_file)[0],
-                                           score))
-
-
-        # output contributions of the differnt ph4 to the global score
-        # output matrix components
-
-        if not os.path.isfile(args.output):
-            with open(args.output, "w") as of:
-                of.write("Param_id\tSource\tTarget\tClass\tScore\t"
-
-                         "CA_contrib\tCZ_contrib\tO_contrib\tN_contrib\t"
-                         "OD1_contrib\tOG_contrib\tNZ_contrib\tDU_contrib\t"
-
-                         "G_fitness\tG_RMSE\tICP_fitness\tICP_RMSE\t"
-
-                         "G_11\tG_12\tG_13\tG_14\t"
-                         "G_21\tG_22\tG_23\tG_24\t"
-                         "G_31\tG_32\tG_33\tG_34\t"
-                         "G_41\tG_42\tG_43\tG_44\t"
-
-                         "ICP_11\tICP_12\tICP_13\tICP_14\t"
-                         "ICP_21\tICP_22\tICP_23\tICP_24\t"
-                         "ICP_31\tICP_32\tICP_33\tICP_34\t"
-                         "ICP_41\tICP_42\tICP_43\tICP_44\n")
-
-        with open(args.output, 'a') as of:
-            of.write(("{}\t{}\t{}\t{}\t{}\t"
-                      "{}\t{}\t{}\t{}\t{}\t{}\t{}\t{}\t"
-                      "{}\t{}\t{}\t{}\t"
-                      "{}\t{}\t{}\t{}\t"
-                      "{}\t{}\t{}\t{}\t"
-                      "{}\t{}\t{}\t{}\t"
-                      "{}\t{}\t{}\t{}\t"
-                      "{}\t{}\t{}\t{}\t"
-                      "{}\t{}\t{}\t{}\t"
-                      "{}\t{}\t{}\t{}\t"
-                      "{}\t{}\t{}\t{}\n"
-                      ).format(args.paramid,
-                               os.path.splitext(source_file)[0],
-                               os.path.splitext(target_file)[0],
-                               args.classification,
-                               score,
-                               ratio_CA_in_aligned,
-                               ratio_CZ_in_aligned,
-                               ratio_O_in_aligned,
-                               ratio_N_in_aligned,
-                               ratio_OD1_in_aligned,
-                               ratio_OG_in_aligned,
-                               ratio_NZ_in_aligned,
-                               ratio_DU_in_aligned,
-                               result_global_cfpfh.fitness,
-                               result_global_cfpfh.inlier_rmse,
-                               result_fine_cfpfh.fitness,
-                               result_fine_cfpfh.inlier_rmse,
-                               np.array(result_global_cfpfh.transformation)[0][0],
-                               np.array(result_global_cfpfh.transformation)[0][1],
-                               np.array(result_global_cfpfh.transformation)[0][2],
-                               np.array(result_global_cfpfh.transformation)[0][3],
-                               np.array(result_global_cfpfh.transformation)[1][0],
-                               np.array(result_global_cfpfh.transformation)[1][1],
-                               np.array(result_global_cfpfh.transformation)[1][2],
-                               np.array(result_global_cfpfh.transformation)[1][3],
-                               np.array(result_global_cfpfh.transformation)[2][0],
-                               np.array(result_global_cfpfh.transformation)[2][1],
-                               np.array(result_global_cfpfh.transformation)[2][2],
-                               np.array(result_global_cfpfh.transformation)[2][3],
-                               np.array(result_global_cfpfh.transformation)[3][0],
-                               np.array(result_global_cfpfh.transformation)[3][1],
-                               np.array(result_global_cfpfh.transformation)[3][2],
-                               np.array(result_global_cfpfh.transformation)[3][3],
-                               np.array(result_fine_cfpfh.transformation)[0][0],
-                               np.array(result_fine_cfpfh.transformation)[0][1],
-                               np.array(result_fine_cfpfh.transformation)[0][2],
-                               np.array(result_fine_cfpfh.transformation)[0][3],
-                               np.array(result_fine_cfpfh.transformation)[1][0],
-                               np.array(result_fine_cfpfh.transformation)[1][1],
-                               np.array(result_fine_cfpfh.transformation)[1][2],
-                               np.array(result_fine_cfpfh.transformation)[1][3],
-                               np.array(result_fine_cfpfh.transformation)[2][0],
-                               np.array(result_fine_cfpfh.transformation)[2][1],
-                               np.array(result_fine_cfpfh.transformation)[2][2],
-                               np.array(result_fine_cfpfh.transformation)[2][3],
-                               np.array(result_fine_cfpfh.transformation)[3][0],
-                               np.array(result_fine_cfpfh.transformation)[3][1],
-                               np.array(result_fine_cfpfh.transformation)[3][2],
-                               np.array(result_fine_cfpfh.transformation)[3][3]
-                               ))
-
-        # cleaning
-        if source_file == target_file:
-            os.system('rm {}'.format(source_file))
+            parser.error('--ligandtransform is not used with --all-vs-all '
+                         'and --pairs-list: ligands are transformed with '
+                         'the alignment of -s/--source')
+        if args.all_vs_all is not None:
+            # all scores are written to the matrix, without result files
+            ignored = [option for option, used in (
+                        ('--output-format', args.output_format != 'tsv'),
+                        ('--top-k', args.top_k is not None),
+                        ('--score-threshold', args.score_threshold is not None),
+                        ('--resume', args.resume),
+                        ('--flush-every', args.flush_every != 1),
+                        ('--transform', args.transform)) if used]
+            if ignored:
+                parser.error('{} cannot be used with --all-vs-all: scores are '
+                             'written to the --matrix file'.format(
+                                                        ', '.join(ignored)))
+            all_vs_all(args)
         else:
-            os.system('rm {} {}'.format(source_file, target_file))
-
-
-
+            pairs(args)
+    else:
+        if args.source is None:
+            parser.error('-s/--source is required')
+        one_vs_many(args)
@@ -35,8 +35,8 @@ import numpy as np
 
 class _mol2_:
 
-    def _mol2_to_pcd(self, ifile_, color_):
-        """ Extracts coordinates from mol2 files and convert into pcd format """
+    def _read_atoms(self, ifile_):
+        """ Lines of the ATOM section of mol2 files """
 
         if ifile_[-5:] != '.mol2':
             print("incorrect file extension")
@@ -58,6 +58,49 @@ class _mol2_:
 
         except:
             print("Cannot process mol2 {}".format(ifile_))
+            return -1
+
+        return atoms
+
+
+
+    def _mol2_to_arrays(self, ifile_, color_, label_):
+        """ Extracts coordinates, properties, pcd colors and pharmacophore 
+        labels from mol2 files, without writing a pcd """
+
+        atoms = self._read_atoms(ifile_)
+        if atoms == -1:
+            return -1, None, None, None
+
+        coordinates = np.empty((len(atoms), 3), dtype=np.float64)
+        labels = np.empty(len(atoms), dtype=np.uint8)
+        properties = []
+        colors = []
+        for i, atm in enumerate(atoms):
+            cols = atm.split()
+            coordinates[i] = [float(cols[2]), float(cols[3]), float(cols[4])]
+            properties.append([int(cols[0]), str(cols[1])])
+            colors.append(color_[str(cols[1])])
+            labels[i] = label_[str(cols[1])]
+
+        return coordinates, properties, colors, labels
+
+
+
+    def _pcd_rgb(self, colors_):
+        """ RGB of pcd colors, as decoded by the open3d pcd reader:
+        the color is read as a float, its bytes give b, g, r """
+
+        data = np.asarray(colors_, dtype='<f4').view(np.uint8).reshape(-1, 4)
+        return data[:, [2, 1, 0]] / 255.0
+
+
+
+    def _mol2_to_pcd(self, ifile_, color_):
+        """ Extracts coordinates from mol2 files and convert into pcd format """
+
+        atoms = self._read_atoms(ifile_)
+        if atoms == -1:
             return -1, None, None
 
 
@@ -240,8 +283,13 @@ class _volsite_cavity_(_mol2_, _pcd_):
                         "DU":"CUB",
                         "OD1":"ASP",}
 
+        # index of each pharmacophore type in the cfpfh color histogram
+        __LABELS = ("CA", "CZ", "O", "OD1", "OG", "N", "NZ", "DU")
+
         self.COLOR = __COLOR
 
+        self.LABEL = {atom:i for i, atom in enumerate(__LABELS)}
+
         self.ATOM = __ATOM
 
         self.ATOM_TYPE = {key:__ATOM_TYPE[val] 
@@ -253,6 +301,22 @@ class _volsite_cavity_(_mol2_, _pcd_):
 
     def mol2_to_pcd(self, ifile_):
         return self._mol2_to_pcd(ifile_, self.COLOR)
+
+
+
+    def mol2_to_arrays(self, ifile_):
+        return self._mol2_to_arrays(ifile_, self.COLOR, self.LABEL)
+
+
+
+    def labels(self, properties_):
+        return np.array([self.LABEL[atom] for index, atom in properties_],
+                        dtype=np.uint8)
+
+
+
+    def pcd_rgb(self, colors_):
+        return self._pcd_rgb(colors_)
         
 
 
@@ -0,0 +1,114 @@
+# ----------------------------------------------------------------------------
+# <                               ProCare                                    >
+# ----------------------------------------------------------------------------
+# The MIT License (MIT)
+#
+# Copyright (c) 2020 Université de Strasbourg
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING
+# FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS
+# IN THE SOFTWARE.
+# ----------------------------------------------------------------------------
+
+
+"""On-disk cache of processed cavities (points, colors, normals, cfpfh)"""
+
+
+import os
+import hashlib
+import tempfile
+import numpy as np
+
+
+# change when the content or the computation of cached entries changes
+# 2: normals and cfpfh from a shared neighbor graph, cfpfh color bins
+#    from pharmacophore labels
+CACHE_VERSION = 2
+
+
+class _feature_cache_:
+
+    def __init__(self, cache_dir_, params_):
+        """params_: processing parameters the entries depend on, 
+        e.g. normal and feature radii and maximum neighbors"""
+
+        self.cache_dir = cache_dir_
+        self.params = "{};{}".format(CACHE_VERSION, 
+                        ";".join("{}={}".format(key, params_[key]) 
+                                                for key in sorted(params_)))
+        os.makedirs(cache_dir_, exist_ok=True)
+
+
+
+    def _key(self, ifile_):
+        """ Hash of the mol2 content and processing parameters """
+
+        sha = hashlib.sha256()
+        with open(ifile_, 'rb') as f:
+            sha.update(f.read())
+        sha.update(self.params.encode())
+        return sha.hexdigest()
+
+
+
+    def _path(self, key_):
+        return os.path.join(self.cache_dir, key_[:2], "{}.npz".format(key_))
+
+
+
+    def load(self, ifile_):
+        """ Returns the cached arrays of a mol2 file, None if not cached """
+
+        try:
+            path = self._path(self._key(ifile_))
+        except IOError:
+            return None
+        if not os.path.isfile(path):
+            return None
+        try:
+            with np.load(path, allow_pickle=False) as entry:
+                return {key: entry[key] for key in entry.files}
+        except (IOError, ValueError):
+            print("feature cache: ignoring unreadable entry {}".format(path))
+            return None
+
+
+
+    def save(self, ifile_, points_, colors_, normals_, cfpfh_, 
+                                                indices_, atoms_):
+        """ Caches the arrays of a mol2 file. The entry is written to a 
+        temporary file then renamed: concurrent readers and writers never
+        see partial entries """
+
+        path = self._path(self._key(ifile_))
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        fd, tmp = tempfile.mkstemp(dir=os.path.dirname(path), suffix='.tmp')
+        try:
+            with os.fdopen(fd, 'wb') as of:
+                np.savez(of, points=np.asarray(points_, dtype=np.float64),
+                             colors=np.asarray(colors_, dtype=np.float64),
+                             normals=np.asarray(normals_, dtype=np.float64),
+                             cfpfh=np.asarray(cfpfh_, dtype=np.float64),
+                             indices=np.asarray(indices_, dtype=np.int64),
+                             atoms=np.asarray(atoms_, dtype=str))
+            os.replace(tmp, path)
+        except IOError:
+            print("feature cache: cannot write to {}".format(path))
+            if os.path.exists(tmp):
+                os.remove(tmp)
+            return -1
+        return path
@@ -0,0 +1,279 @@
+# ----------------------------------------------------------------------------
+# <                               ProCare                                    >
+# ----------------------------------------------------------------------------
+# The MIT License (MIT)
+#
+# Copyright (c) 2020 Université de Strasbourg
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING
+# FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS
+# IN THE SOFTWARE.
+# ----------------------------------------------------------------------------
+
+
+"""Binary library of processed cavities for screening: coordinates, 
+pharmacophore labels, normals and cfpfh of many cavities in one 
+memory-mapped file"""
+
+
+import os
+import json
+import shutil
+import struct
+import tempfile
+import numpy as np
+
+from .convert import _volsite_cavity_
+from .open3d.open3d.geometry import PointCloud
+from .open3d.open3d.geometry import KDTreeSearchParamHybrid
+from .open3d.open3d.registration import compute_normals_and_cfpfh_feature_batch
+
+
+MAGIC = b'PROCLIB1'
+ALIGNMENT = 64
+
+# label of a point: index in the cfpfh color histogram order
+LABELS = ("CA", "CZ", "O", "OD1", "OG", "N", "NZ", "DU")
+
+# name: (dtype, number of columns)
+ARRAYS = {"points": ('<f4', 3),
+          "normals": ('<f4', 3),
+          "cfpfh": ('<f4', 41),
+          "labels": ('u1', 1),
+          "indices": ('<i4', 1)}
+
+
+
+class _library_:
+
+    """Read-only library. Arrays are memory-mapped: opening is immediate
+    and processes opening the same file share one copy in the page cache.
+    Per point arrays of all cavities are concatenated, cavity i spans 
+    rows offsets[i]:offsets[i]+counts[i]"""
+
+    def __init__(self, ifile_):
+
+        with open(ifile_, 'rb') as f:
+            magic = f.read(len(MAGIC))
+            if magic != MAGIC:
+                raise ValueError("{} is not a procare library".format(ifile_))
+            header_size, = struct.unpack('<Q', f.read(8))
+            header = json.loads(f.read(header_size).decode())
+
+        self.ifile = ifile_
+        self.params = header["params"]
+        self.names = header["names"]
+        self.counts = np.asarray(header["counts"], dtype=np.int64)
+        self.offsets = np.zeros(len(self.counts), dtype=np.int64)
+        self.offsets[1:] = np.cumsum(self.counts)[:-1]
+        self._positions = {name: i for i, name in enumerate(self.names)}
+
+        n_points = int(self.counts.sum())
+        self.arrays = {}
+        for name, (dtype, ncols) in ARRAYS.items():
+            shape = (n_points, ncols) if ncols > 1 else (n_points,)
+            if n_points == 0:
+                self.arrays[name] = np.empty(shape, dtype=dtype)
+                continue
+            self.arrays[name] = np.memmap(ifile_, dtype=dtype, mode='r',
+                                          offset=header["arrays"][name],
+                                          shape=shape)
+
+
+
+    def __len__(self):
+        return len(self.names)
+
+
+
+    def index(self, name_):
+        return self._positions[name_]
+
+
+
+    def get(self, i_):
+        """ Arrays of the cavity at position i_ (views in the mapped file) """
+
+        start = self.offsets[i_]
+        stop = start + self.counts[i_]
+        entry = {name: array[start:stop] for name, array in self.arrays.items()}
+        entry["name"] = self.names[i_]
+        return entry
+
+
+
+    def properties(self, i_):
+        """ Point properties [[index, atom], ...] of the cavity at i_ """
+
+        entry = self.get(i_)
+        return [[int(index), LABELS[label]] 
+                    for index, label in zip(entry["indices"], entry["labels"])]
+
+
+
+def _align(of_):
+    of_.write(b'\0' * (-of_.tell() % ALIGNMENT))
+
+
+
+def write_library(ofile_, cavities_, params_):
+
+    """Writes a library from an iterable of (name, arrays) where arrays
+    has the points, normals, cfpfh (41, n), labels and indices of a cavity.
+    Arrays are streamed to temporary files: the collection does not need 
+    to fit in memory"""
+
+    tmp_dir = tempfile.mkdtemp(dir=os.path.dirname(os.path.abspath(ofile_)))
+    try:
+        tmp_files = {name: open(os.path.join(tmp_dir, name), 'wb') 
+                                                        for name in ARRAYS}
+        names = []
+        counts = []
+        for name, arrays in cavities_:
+            names.append(name)
+            counts.append(len(arrays["points"]))
+            arrays = dict(arrays)
+            # stored point-major: the block of a cavity is contiguous
+            arrays["cfpfh"] = np.asarray(arrays["cfpfh"]).T
+            for key, (dtype, ncols) in ARRAYS.items():
+                tmp_files[key].write(np.ascontiguousarray(arrays[key], 
+                                                        dtype=dtype).tobytes())
+        for f in tmp_files.values():
+            f.close()
+
+        # array positions depend on the header size: grown until stable
+        header = {"params": params_, "names": names, "counts": counts,
+                  "arrays": {name: 0 for name in ARRAYS}}
+        while True:
+            header_bytes = json.dumps(header).encode()
+            position = len(MAGIC) + 8 + len(header_bytes)
+            positions = {}
+            for name in ARRAYS:
+                position += -position % ALIGNMENT
+                positions[name] = position
+                position += os.path.getsize(os.path.join(tmp_dir, name))
+            if positions == header["arrays"]:
+                break
+            header["arrays"] = positions
+
+        tmp_ofile = os.path.join(tmp_dir, 'library')
+        with open(tmp_ofile, 'wb') as of:
+            of.write(MAGIC)
+            of.write(struct.pack('<Q', len(header_bytes)))
+            of.write(header_bytes)
+            for name in ARRAYS:
+                _align(of)
+                with open(os.path.join(tmp_dir, name), 'rb') as f:
+                    shutil.copyfileobj(f, of)
+        os.replace(tmp_ofile, ofile_)
+    finally:
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+
+    return ofile_
+
+
+
+def _process_batch(batch_, params_):
+
+    """Normals and cfpfh of a batch of cavities, one cavity per thread"""
+
+    cfpfhs = compute_normals_and_cfpfh_feature_batch(
+        [pc for _, pc, _ in batch_],
+        KDTreeSearchParamHybrid(radius=params_["normalrad"], 
+                                max_nn=params_["normalmaxn"]),
+        KDTreeSearchParamHybrid(radius=params_["featurerad"], 
+                                max_nn=params_["featuremaxn"]))
+
+    for (name, pointcloud, properties), cfpfh in zip(batch_, cfpfhs):
+        yield name, {"points": np.asarray(pointcloud.points),
+                     "normals": np.asarray(pointcloud.normals),
+                     "cfpfh": np.asarray(cfpfh.data),
+                     "labels": np.array(pointcloud.labels),
+                     "indices": [index for index, atom in properties]}
+
+
+
+def process_cavities(mol2_files_, params_, batch_=256):
+
+    """Parses cavities and computes their normals and cfpfh by batches
+    of batch_ cavities, yields (name, arrays) for write_library"""
+
+    cavity = _volsite_cavity_()
+    batch = []
+    for mol2_file in mol2_files_:
+        coordinates, properties, colors, labels = cavity.mol2_to_arrays(
+                                                                    mol2_file)
+        if properties is None:
+            continue
+        pointcloud = PointCloud(coordinates, colors=cavity.pcd_rgb(colors),
+                                labels=labels)
+        name = os.path.splitext(os.path.basename(mol2_file))[0]
+        batch.append((name, pointcloud, properties))
+        if len(batch) == batch_:
+            yield from _process_batch(batch, params_)
+            batch = []
+    if batch:
+        yield from _process_batch(batch, params_)
+
+
+
+if __name__ == '__main__':
+
+    import argparse
+
+    parser = argparse.ArgumentParser(description='Builds a procare library')
+    parser.add_argument('-i', '--input', type=str,
+                help="directory of mol2 cavities or file listing mol2 files",
+                required=True)
+    parser.add_argument('-o', '--output', type=str,
+                help="library file",
+                required=True)
+    parser.add_argument('-nr', '--normalrad', type=float,
+                help='Radius for local surface normal estimation',
+                default=3.1)
+    parser.add_argument('-nm', '--normalmaxn', type=int,
+                help='Maximum number of neighbors for normal estimation',
+                default=471)
+    parser.add_argument('-fr', '--featurerad', type=float,
+                help='Radius for local surface feature estimation',
+                default=3.1)
+    parser.add_argument('-fm', '--featuremaxn', type=int,
+                help='Maximum number of neighbors for feature estimation',
+                default=135)
+    parser.add_argument('-b', '--batch', type=int,
+                help='Number of cavities processed in one call, '
+                     'one cavity per thread',
+                default=256)
+
+    args = parser.parse_args()
+
+    if os.path.isdir(args.input):
+        mol2_files = sorted([os.path.join(args.input, f) 
+                        for f in os.listdir(args.input) if f[-5:] == '.mol2'])
+    else:
+        with open(args.input, 'r') as f:
+            mol2_files = [l.strip() for l in f 
+                            if l.strip() != '' and not l.startswith('#')]
+
+    params = {"normalrad": args.normalrad,
+              "normalmaxn": args.normalmaxn,
+              "featurerad": args.featurerad,
+              "featuremaxn": args.featuremaxn}
+
+    write_library(args.output, 
+                  process_cavities(mol2_files, params, args.batch), params)
+    print("written library to {}".format(args.output))
@@ -27,6 +27,7 @@
 import numpy as np
 from sklearn.neighbors import NearestNeighbors
 import math
+from collections import Counter
 
 
 class _similarity_metrics_:
@@ -471,6 +472,37 @@ class _ph4_ext_(_similarity_metrics_, _distances_):
 
 
 
+class _ph4_ext_bound_(_similarity_metrics_):
+    """ upper bound of _ph4_ext_ scores, from point properties only:
+        a fit point is counted at most once, and only if a reference 
+        point of the same property is within 1.5 A. Cavity points lie on 
+        the 1.5 A VolSite grid: a ball of radius 1.5 A holds at most 8 grid 
+        points, so a reference point can account for at most 8 fit points 
+        of its property """
+
+    # grid points within 1.5 A of any position, on a 1.5 A cubic grid
+    MAX_FIT_PER_REF = 8
+
+    def __init__(self, source_properties_, target_properties_):
+
+        # same fit/ref choice as _ph4_ext_
+        if len(source_properties_) > len(target_properties_):
+            self.fitProp = target_properties_
+            self.refProp = source_properties_
+        else:
+            self.fitProp = source_properties_
+            self.refProp = target_properties_
+
+        self.fitsize = len(self.fitProp)
+        self.refsize = len(self.refProp)
+
+        fit_count = Counter([p[1] for p in self.fitProp])
+        ref_count = Counter([p[1] for p in self.refProp])
+        self.n_identity = sum([min(n, self.MAX_FIT_PER_REF * ref_count[prop])
+                               for prop, n in fit_count.items()])
+
+
+
 class _ph4_soft_(_similarity_metrics_, _distances_):
     """ 1-NN search and 
         strict correspondence of properties """
@@ -0,0 +1,395 @@
+# ----------------------------------------------------------------------------
+# <                               ProCare                                    >
+# ----------------------------------------------------------------------------
+# The MIT License (MIT)
+#
+# Copyright (c) 2020 Université de Strasbourg
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING
+# FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS
+# IN THE SOFTWARE.
+# ----------------------------------------------------------------------------
+
+
+"""Result outputs of procare runs: tab-separated files, written per pair 
+or by batches, or binary columns"""
+
+
+import os
+import json
+import heapq
+import numpy as np
+
+
+CONTRIBUTIONS = ("CA", "CZ", "O", "N", "OD1", "OG", "NZ", "DU")
+
+SCORE_HEADER = "Source\tTarget\tScore\n"
+
+HEADER = ("Param_id\tSource\tTarget\tClass\tScore\t"
+
+          "CA_contrib\tCZ_contrib\tO_contrib\tN_contrib\t"
+          "OD1_contrib\tOG_contrib\tNZ_contrib\tDU_contrib\t"
+
+          "G_fitness\tG_RMSE\tICP_fitness\tICP_RMSE\t"
+
+          "G_11\tG_12\tG_13\tG_14\t"
+          "G_21\tG_22\tG_23\tG_24\t"
+          "G_31\tG_32\tG_33\tG_34\t"
+          "G_41\tG_42\tG_43\tG_44\t"
+
+          "ICP_11\tICP_12\tICP_13\tICP_14\t"
+          "ICP_21\tICP_22\tICP_23\tICP_24\t"
+          "ICP_31\tICP_32\tICP_33\tICP_34\t"
+          "ICP_41\tICP_42\tICP_43\tICP_44\n")
+
+# binary columns: name: number of float64 values per pair
+COLUMNS = {"score": 1,
+           "contributions": len(CONTRIBUTIONS),
+           "registration": 4,   # G_fitness, G_RMSE, ICP_fitness, ICP_RMSE
+           "ransac_transformation": 16,
+           "icp_transformation": 16}
+
+# binary index of pairs, one line per pair: Param_id, Source, Target, Class
+INDEX = "pairs.tsv"
+
+
+
+def _write_synced(ofile_, data_, mode_='a'):
+    """ Single write synced to disk: an interruption leaves complete 
+    rows, and at most a torn last one """
+
+    with open(ofile_, mode_) as of:
+        of.write(data_)
+        of.flush()
+        os.fsync(of.fileno())
+
+
+
+def _reversed_lines(f_, block_=1 << 16):
+    """ Lines of a binary file from the last one, with their offset, read 
+    by blocks from the end: only the tail of large outputs is read """
+
+    pos = f_.seek(0, os.SEEK_END)
+    buf = b''
+    while pos > 0:
+        size = min(block_, pos)
+        pos -= size
+        f_.seek(pos)
+        buf = f_.read(size) + buf
+        # lines after the first newline of buf are complete
+        cut = buf.rfind(b'\n', 0, len(buf) - 1)
+        while cut >= 0:
+            yield pos + cut + 1, buf[cut + 1:]
+            buf = buf[:cut + 1]
+            cut = buf.rfind(b'\n', 0, len(buf) - 1)
+    if buf:
+        yield 0, buf
+
+
+
+def _truncate_synced(f_, size_):
+    f_.truncate(size_)
+    f_.flush()
+    os.fsync(f_.fileno())
+
+
+
+def _count_lines(ifile_, block_=1 << 20):
+    with open(ifile_, 'rb') as f:
+        return sum(block.count(b'\n') 
+                        for block in iter(lambda: f.read(block_), b''))
+
+
+
+def _truncate_torn_line(ifile_):
+    """ Removes a last line without end of line left by an interruption """
+
+    with open(ifile_, 'rb+') as f:
+        for start, line in _reversed_lines(f):
+            if not line.endswith(b'\n'):
+                f.truncate(start)
+            break
+
+
+
+class _sink_:
+
+    """Buffers pairs and writes them every flush_every_ pairs.
+    Registration results need fitness, inlier_rmse and transformation"""
+
+    def __init__(self, flush_every_=1):
+        self.flush_every = flush_every_
+        self.pairs = []
+
+
+
+    def add(self, paramid_, classification_, source_name_, target_name_, 
+                    score_, contributions_, result_global_, result_fine_):
+
+        self.pairs.append((paramid_, classification_, source_name_, 
+                           target_name_, score_, contributions_, 
+                           result_global_.fitness, result_global_.inlier_rmse,
+                           result_fine_.fitness, result_fine_.inlier_rmse,
+                           np.asarray(result_global_.transformation).ravel(),
+                           np.asarray(result_fine_.transformation).ravel()))
+        if len(self.pairs) >= self.flush_every:
+            self.flush()
+
+
+
+    def flush(self):
+        if self.pairs:
+            self._write(self.pairs)
+        self.pairs = []
+
+
+
+    def close(self):
+        self.flush()
+
+
+
+class _tsv_sink_(_sink_):
+
+    """Score file and complete output file (49 columns)"""
+
+    def __init__(self, output_, scoreoutput_, flush_every_=1):
+        _sink_.__init__(self, flush_every_)
+        self.output = output_
+        self.scoreoutput = scoreoutput_
+
+
+
+    def _write(self, pairs_):
+        score_rows = ""
+        rows = ""
+        for paramid, classification, source, target, score, contributions, \
+                g_fitness, g_rmse, icp_fitness, icp_rmse, g, icp in pairs_:
+            score_rows += "{}\t{}\t{}\n".format(source, target, score)
+            rows += "\t".join(["{}"] * 49).format(paramid, source, target, 
+                                    classification, score, *contributions, 
+                                    g_fitness, g_rmse, icp_fitness, icp_rmse, 
+                                    *g, *icp) + "\n"
+
+        if not os.path.isfile(self.scoreoutput):
+            _write_synced(self.scoreoutput, SCORE_HEADER, 'w')
+        if not os.path.isfile(self.output):
+            _write_synced(self.output, HEADER, 'w')
+        # the complete output, index of completed pairs, is written last
+        _write_synced(self.scoreoutput, score_rows)
+        _write_synced(self.output, rows)
+
+
+
+    def completed(self, paramid_):
+        """ Pairs of the complete output for a parameter id, as (source, 
+        target). Outputs are repaired first: a torn last line is removed,
+        as are score rows of pairs missing from the complete output """
+
+        if not os.path.isfile(self.output):
+            return set()
+
+        _truncate_torn_line(self.output)
+        completed = set()
+        all_pairs = set()
+        with open(self.output, 'r') as f:
+            next(f, None)
+            for l in f:
+                cols = l.split('\t', 3)
+                all_pairs.add((cols[1], cols[2]))
+                if cols[0] == paramid_:
+                    completed.add((cols[1], cols[2]))
+
+        if os.path.isfile(self.scoreoutput):
+            _truncate_torn_line(self.scoreoutput)
+            # only the last batch can have been written to the score file 
+            # alone: its rows are removed from the end, the header is kept
+            with open(self.scoreoutput, 'rb+') as f:
+                end = None
+                for start, line in _reversed_lines(f):
+                    if start == 0 or tuple(line.decode().split('\t')[:2]) \
+                                                                in all_pairs:
+                        break
+                    end = start
+                if end is not None:
+                    _truncate_synced(f, end)
+
+        return completed
+
+
+
+class _columnar_sink_(_sink_):
+
+    """Directory of binary columns: one raw float64 file per column 
+    (see COLUMNS), in pair order, and the pairs index. 
+    Load with load_columnar"""
+
+    def __init__(self, directory_, flush_every_=1):
+        _sink_.__init__(self, flush_every_)
+        self.directory = directory_
+        os.makedirs(directory_, exist_ok=True)
+        meta = os.path.join(directory_, "meta.json")
+        if not os.path.isfile(meta):
+            with open(meta, 'w') as of:
+                json.dump({"dtype": "<f8", "columns": COLUMNS, 
+                           "contributions": CONTRIBUTIONS,
+                           "registration": ["G_fitness", "G_RMSE", 
+                                            "ICP_fitness", "ICP_RMSE"],
+                           "index": INDEX}, of, indent=4)
+        self._repair()
+
+
+
+    def _path(self, name_):
+        return os.path.join(self.directory, "{}.f8".format(name_))
+
+
+
+    def _repair(self):
+        """ Keeps the pairs complete in every column and in the index,
+        the index being written last """
+
+        index = os.path.join(self.directory, INDEX)
+        # without index, no pair is complete: columns are emptied
+        n = 0
+        if os.path.isfile(index):
+            _truncate_torn_line(index)
+            n = _count_lines(index)
+        n_index = n
+        for name, ncols in COLUMNS.items():
+            path = self._path(name)
+            if os.path.isfile(path):
+                n = min(n, os.path.getsize(path) // (8 * ncols))
+        for name, ncols in COLUMNS.items():
+            path = self._path(name)
+            if os.path.isfile(path):
+                with open(path, 'rb+') as f:
+                    f.truncate(n * 8 * ncols)
+        # index lines of pairs missing from a column are removed from the end
+        if n_index > n:
+            with open(index, 'rb+') as f:
+                for i, (start, line) in enumerate(_reversed_lines(f)):
+                    if i == n_index - n - 1:
+                        _truncate_synced(f, start)
+                        break
+
+
+
+    def _write(self, pairs_):
+        columns = {"score": [], "contributions": [], "registration": [],
+                   "ransac_transformation": [], "icp_transformation": []}
+        index = ""
+        for paramid, classification, source, target, score, contributions, \
+                g_fitness, g_rmse, icp_fitness, icp_rmse, g, icp in pairs_:
+            columns["score"].append(score)
+            columns["contributions"].append(contributions)
+            columns["registration"].append([g_fitness, g_rmse, 
+                                            icp_fitness, icp_rmse])
+            columns["ransac_transformation"].append(g)
+            columns["icp_transformation"].append(icp)
+            index += "{}\t{}\t{}\t{}\n".format(paramid, source, target, 
+                                                            classification)
+
+        for name, values in columns.items():
+            with open(self._path(name), 'ab') as of:
+                of.write(np.asarray(values, dtype='<f8').tobytes())
+                of.flush()
+                os.fsync(of.fileno())
+        _write_synced(os.path.join(self.directory, INDEX), index)
+
+
+
+    def completed(self, paramid_):
+        """ Pairs of the index for a parameter id, as (source, target) """
+
+        completed = set()
+        index = os.path.join(self.directory, INDEX)
+        if os.path.isfile(index):
+            with open(index, 'r') as f:
+                for l in f:
+                    cols = l.split('\t', 3)
+                    if cols[0] == paramid_:
+                        completed.add((cols[1], cols[2]))
+        return completed
+
+
+
+class _top_k_:
+
+    """Bounded selection of the k best scored pairs of a run. On equal 
+    scores, the first pairs are kept"""
+
+    def __init__(self, k_):
+        self.k = k_
+        self.heap = []
+        self.count = 0
+
+
+
+    def admits(self, score_):
+        """ Whether a pair with this score would be kept now """
+
+        return len(self.heap) < self.k or score_ > self.heap[0][0]
+
+
+
+    def push(self, score_, item_):
+        entry = (score_, -self.count, item_)
+        self.count += 1
+        if len(self.heap) < self.k:
+            heapq.heappush(self.heap, entry)
+        elif score_ > self.heap[0][0]:
+            heapq.heapreplace(self.heap, entry)
+
+
+
+    def best(self):
+        """ Kept items, best score first """
+
+        return [entry[2] for entry in sorted(self.heap, 
+                                    key=lambda e: (e[0], e[1]), reverse=True)]
+
+
+
+def load_columnar(directory_, mmap_=True):
+
+    """Loads binary columns: returns the pairs index as a list of 
+    [Param_id, Source, Target, Class] and a dict of arrays of shape
+    (n_pairs, ncols); transformations have shape (n_pairs, 4, 4)"""
+
+    with open(os.path.join(directory_, "meta.json"), 'r') as f:
+        meta = json.load(f)
+    with open(os.path.join(directory_, meta["index"]), 'r') as f:
+        index = [l.rstrip('\n').split('\t') for l in f]
+
+    columns = {}
+    for name, ncols in meta["columns"].items():
+        path = os.path.join(directory_, "{}.f8".format(name))
+        n = min(len(index), os.path.getsize(path) // (8 * ncols))
+        if mmap_ and n > 0:
+            values = np.memmap(path, dtype=meta["dtype"], mode='r', 
+                                                    shape=(n, ncols))
+        else:
+            values = np.fromfile(path, dtype=meta["dtype"], 
+                                    count=n * ncols).reshape(n, ncols)
+        if ncols == 16:
+            values = values.reshape(n, 4, 4)
+        elif ncols == 1:
+            values = values.reshape(n)
+        columns[name] = values
+
+    return index, columns
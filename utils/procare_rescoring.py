@@ -945,10 +945,8 @@ class _color_fingerprint_distances_(_fingerprint_distances_rules_):
 class _cfpfh_distances_(_fingerprint_distances_rules_):
 
     def __reshape(self, open3d_cfpfh_):
-        points_cfpfh = []
-        for p_indx in range(len(open3d_cfpfh_[0])):
-            points_cfpfh.append([bins[p_indx] for bins in open3d_cfpfh_])
-        return np.array(points_cfpfh)
+        # (dimension, num) view of the feature data --> one vector per point
+        return np.asarray(open3d_cfpfh_).T
             
 
     def __init__(self, source_cfpfh_, target_cfpfh_):
@@ -962,11 +960,11 @@ class _cfpfh_distances_(_fingerprint_distances_rules_):
             self.ref_cfpfh = self.target_cfpfh.data
             self.fit_cfpfh = self.source_cfpfh.data
 
-        self.ref_cfpfh_shape = np.array([fpfh_bins for fpfh_bins in self.ref_cfpfh[:33]])
-        self.fit_cfpfh_shape = np.array([fpfh_bins for fpfh_bins in self.fit_cfpfh[:33]])
+        self.ref_cfpfh_shape = np.asarray(self.ref_cfpfh)[:33]
+        self.fit_cfpfh_shape = np.asarray(self.fit_cfpfh)[:33]
 
-        self.ref_cfpfh_color = np.array([fpfh_bins for fpfh_bins in self.ref_cfpfh[33:]])
-        self.fit_cfpfh_color = np.array([fpfh_bins for fpfh_bins in self.fit_cfpfh[33:]])
+        self.ref_cfpfh_color = np.asarray(self.ref_cfpfh)[33:]
+        self.fit_cfpfh_color = np.asarray(self.fit_cfpfh)[33:]
 
         self.ref_cfpfh = self.__reshape(self.ref_cfpfh)
         self.fit_cfpfh = self.__reshape(self.fit_cfpfh)